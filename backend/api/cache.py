@@ -0,0 +1,65 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.models import DataVersion
+from recipes.models import Recipe
+
+RECIPE_FRAGMENTS_VERSION = 'recipe_fragments'
+
+
+def get_version(name):
+    """Текущая версия набора данных name."""
+    version = (
+        DataVersion.objects
+        .filter(name=name)
+        .values_list('version', flat=True)
+        .first()
+    )
+    return version or 1
+
+
+@transaction.atomic
+def bump_version(name):
+    """Объявляет устаревшими все данные, построенные по версии name."""
+    versions = DataVersion.objects.filter(name=name)
+    if not versions.update(version=F('version') + 1):
+        _, created = DataVersion.objects.get_or_create(
+            name=name, defaults={'version': 2}
+        )
+        if not created:
+            versions.update(version=F('version') + 1)
+    # Строка заблокирована обновлением до конца транзакции.
+    return versions.values_list('version', flat=True).get()
+
+
+def recipe_fragment_keys(recipes):
+    """
+    Ключи кэша общей части представления рецептов.
+
+    Ключ меняется вместе с updated_at рецепта, поэтому устаревшее
+    представление не читается ни одним процессом, даже если запрос,
+    параллельный записи, успел сохранить его в кэш.
+    """
+    version = get_version(RECIPE_FRAGMENTS_VERSION)
+    return {
+        recipe.pk: (
+            f'recipe_fragment:{version}:{recipe.pk}:'
+            f'{recipe.updated_at.timestamp()}'
+        )
+        for recipe in recipes
+    }
+
+
+def touch_recipes(*recipe_ids):
+    """Обновляет updated_at рецептов, чьи связанные данные изменились."""
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )
+
+
+def touch_author_recipes(author_id):
+    """Обновляет updated_at рецептов автора, чьи данные изменились."""
+    Recipe.objects.filter(author=author_id).update(
+        updated_at=timezone.now()
+    )
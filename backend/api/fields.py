@@ -1,15 +1,112 @@
-import base64
+import binascii
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
 from rest_framework.fields import ImageField
 
+# Количество символов base64, читаемых из строки за раз.
+DECODE_CHUNK_SIZE = 64 * 1024
+# Пробельные символы, которые допускаются внутри base64 (переносы строк).
+BASE64_WHITESPACE = ' \t\r\n'
+IMAGE_SIGNATURES = {
+    'jpeg': (b'\xff\xd8\xff',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'gif': (b'GIF87a', b'GIF89a'),
+    'webp': (b'RIFF',),
+}
+
 
 class Base64ImageField(ImageField):
-    """Custom field type for images."""
+    """
+    Custom field type for images.
+
+    Принимает загруженный файл (multipart/form-data) или строку data URI.
+    Размер и формат проверяются до декодирования, base64 декодируется
+    частями во временный файл на диске: Django проверяет изображение
+    по пути к файлу, не читая его целиком в память.
+    """
+
+    default_error_messages = {
+        'image_too_large': (
+            'Размер изображения не должен превышать {max_size} байт.'
+        ),
+        'invalid_image_format': (
+            'Допустимые форматы изображений: {formats}.'
+        ),
+        'invalid_base64': 'Некорректные данные изображения.',
+    }
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            image_format, imgstr = data.split(';base64,')
-            ext = image_format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode_data_uri(data)
+        elif getattr(data, 'size', 0) > settings.MAX_IMAGE_SIZE:
+            self.fail('image_too_large', max_size=settings.MAX_IMAGE_SIZE)
         return super().to_internal_value(data)
+
+    def decode_chunk(self, chunk):
+        try:
+            return binascii.a2b_base64(chunk)
+        except binascii.Error:
+            self.fail('invalid_base64')
+
+    def decode_chunks(self, imgstr):
+        """
+        Декодирует base64 частями, пропуская пробельные символы.
+
+        Каждая часть декодируется целым числом групп по 4 символа,
+        остаток переносится в следующую часть.
+        """
+        rest = ''
+        for start in range(0, len(imgstr), DECODE_CHUNK_SIZE):
+            chunk = rest + ''.join(
+                imgstr[start:start + DECODE_CHUNK_SIZE].split()
+            )
+            usable = len(chunk) - len(chunk) % 4
+            rest = chunk[usable:]
+            yield self.decode_chunk(chunk[:usable])
+        if rest:
+            self.fail('invalid_base64')
+
+    def decode_data_uri(self, data):
+        image_format, separator, imgstr = data.partition(';base64,')
+        if not separator:
+            self.fail('invalid_base64')
+        ext = image_format.split('/')[-1].lower()
+        if ext == 'jpg':
+            ext = 'jpeg'
+        if ext not in IMAGE_SIGNATURES:
+            self.fail(
+                'invalid_image_format', formats=', '.join(IMAGE_SIGNATURES)
+            )
+
+        imgstr = imgstr.rstrip(BASE64_WHITESPACE)
+        length = len(imgstr) - sum(
+            imgstr.count(char) for char in BASE64_WHITESPACE
+        )
+        size = length * 3 // 4 - imgstr[-2:].count('=')
+        if size > settings.MAX_IMAGE_SIZE:
+            self.fail('image_too_large', max_size=settings.MAX_IMAGE_SIZE)
+        head = self.decode_chunk(''.join(imgstr[:64].split())[:16])
+        if (
+            not head.startswith(IMAGE_SIGNATURES[ext])
+            or ext == 'webp' and head[8:12] != b'WEBP'
+        ):
+            self.fail(
+                'invalid_image_format', formats=', '.join(IMAGE_SIGNATURES)
+            )
+
+        image = TemporaryUploadedFile(
+            name='temp.' + ext,
+            content_type=f'image/{ext}',
+            size=size,
+            charset=None,
+        )
+        try:
+            for chunk in self.decode_chunks(imgstr):
+                image.write(chunk)
+        except Exception:
+            image.close()
+            raise
+        image.size = image.tell()
+        image.seek(0)
+        return image
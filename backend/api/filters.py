@@ -1,5 +1,10 @@
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
 from django_filters.rest_framework import FilterSet, filters
 
+from foodgram.settings import SEARCH_CONFIG
 from recipes.models import Ingredient, Recipe, Tag
 
 
@@ -27,6 +32,11 @@ class RecipeFilter(FilterSet):
         field_name='in_shopping_list__user',
         method='filter_by_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_by_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('trending', 'По популярности'),),
+        method='filter_by_ordering'
+    )
 
     class Meta:
         model = Recipe
@@ -41,3 +51,53 @@ class RecipeFilter(FilterSet):
         if value:
             return queryset.filter(in_favorites__user=self.request.user)
         return queryset.exclude(in_favorites__user=self.request.user)
+
+    def filter_by_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию и описанию рецепта.
+
+        В PostgreSQL используется поисковый вектор и триграммное сходство
+        названия, результаты сортируются по релевантности. В остальных
+        базах поиск идет по вхождению подстроки, совпадения в названии
+        выводятся первыми.
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(
+                value, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            return (
+                queryset
+                .filter(
+                    Q(search_vector=query) | Q(name__trigram_similar=value)
+                )
+                .annotate(rank=(
+                    SearchRank(F('search_vector'), query)
+                    + TrigramSimilarity('name', value)
+                ))
+                .order_by('-rank', '-pub_date')
+            )
+        return (
+            queryset
+            .filter(Q(name__icontains=value) | Q(text__icontains=value))
+            .annotate(rank=Case(
+                When(name__icontains=value, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ))
+            .order_by('-rank', '-pub_date')
+        )
+
+    def filter_by_ordering(self, queryset, name, value):
+        """
+        Сортировка по популярности из таблицы RecipeTrend.
+
+        Рецепты без очков идут последними, по дате публикации.
+        """
+        if value == 'trending':
+            return queryset.order_by(
+                F('trend__score').desc(nulls_last=True), '-pub_date', '-id'
+            )
+        return queryset
@@ -0,0 +1,196 @@
+"""
+Метрики запросов: время ответа, SQL, время обработчика и рендеринга.
+
+MetricsMiddleware собирает метрики каждого запроса и отдает их
+в заголовке Server-Timing (если SERVER_TIMING = True) и в Prometheus.
+MetricsViewMixin отмечает границы обработчика DRF и рендеринга ответа.
+
+При нескольких процессах gunicorn метрики пишутся в каталог
+PROMETHEUS_MULTIPROC_DIR и суммируются по всем процессам в /metrics.
+"""
+import contextvars
+import os
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, float('inf')
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500, float('inf'))
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время обработки запроса.',
+    ('method', 'route', 'status'),
+)
+DB_QUERIES = Histogram(
+    'foodgram_request_db_queries',
+    'Количество SQL-запросов за запрос.',
+    ('method', 'route'),
+    buckets=QUERY_BUCKETS,
+)
+DB_DURATION = Histogram(
+    'foodgram_request_db_duration_seconds',
+    'Суммарное время SQL-запросов за запрос.',
+    ('method', 'route'),
+)
+VIEW_DURATION = Histogram(
+    'foodgram_request_view_duration_seconds',
+    'Время обработчика DRF без учета SQL (в основном сериализация).',
+    ('method', 'route'),
+)
+RENDER_DURATION = Histogram(
+    'foodgram_request_render_duration_seconds',
+    'Время рендеринга ответа DRF.',
+    ('method', 'route'),
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_size_bytes',
+    'Размер тела ответа (кроме потоковых ответов).',
+    ('method', 'route'),
+    buckets=SIZE_BUCKETS,
+)
+REQUESTS_STREAMED = Counter(
+    'foodgram_streaming_responses',
+    'Количество потоковых ответов.',
+    ('method', 'route'),
+)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Метрики одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.view_time = None
+        self.render_time = None
+        self._view_started = None
+        self._view_db_time = 0.0
+        self._render_started = None
+
+    def execute(self, execute, sql, params, many, context):
+        """Обертка connection.execute_wrapper: считает запросы и их время."""
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += perf_counter() - started
+
+    def start_view(self):
+        self._view_started = perf_counter()
+        self._view_db_time = self.db_time
+
+    def finish_view(self):
+        if self._view_started is None:
+            return
+        elapsed = perf_counter() - self._view_started
+        self.view_time = elapsed - (self.db_time - self._view_db_time)
+        self._render_started = perf_counter()
+
+    def finish_render(self):
+        if self._render_started is not None:
+            self.render_time = perf_counter() - self._render_started
+
+    def server_timing(self, total):
+        timings = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"'
+        ]
+        if self.view_time is not None:
+            timings.append(f'view;dur={self.view_time * 1000:.1f}')
+        if self.render_time is not None:
+            timings.append(f'render;dur={self.render_time * 1000:.1f}')
+        timings.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(timings)
+
+
+def current_metrics():
+    return _current.get()
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = perf_counter() - started
+        self.observe(request, response, metrics, total)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing(total)
+        return response
+
+    @staticmethod
+    def observe(request, response, metrics, total):
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        method = request.method
+        REQUEST_DURATION.labels(
+            method, route, str(response.status_code)
+        ).observe(total)
+        DB_QUERIES.labels(method, route).observe(metrics.queries)
+        DB_DURATION.labels(method, route).observe(metrics.db_time)
+        if metrics.view_time is not None:
+            VIEW_DURATION.labels(method, route).observe(metrics.view_time)
+        if metrics.render_time is not None:
+            RENDER_DURATION.labels(method, route).observe(metrics.render_time)
+        if response.streaming:
+            # Тело еще не сформировано: SQL генератора сюда не входит.
+            REQUESTS_STREAMED.labels(method, route).inc()
+        else:
+            RESPONSE_SIZE.labels(method, route).observe(len(response.content))
+
+
+class MetricsViewMixin:
+    """Отмечает для MetricsMiddleware время обработчика и рендеринга."""
+
+    def initial(self, request, *args, **kwargs):
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.start_view()
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.finish_view()
+            if hasattr(response, 'add_post_render_callback'):
+                response.add_post_render_callback(
+                    lambda rendered: metrics.finish_render()
+                )
+        return response
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus."""
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+    )
@@ -1,6 +1,14 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models.signals import post_delete, post_save
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 
+from recipes.counters import change_counter, mark_counted
+from recipes.images import image_srcset
+from recipes.models import Recipe
+from users.models import CustomUser
+
 
 class IngredienteMixin:
     @staticmethod
@@ -17,58 +25,365 @@ class IngredienteMixin:
 
         model.objects.bulk_create(ingredients_obj)
 
+    @staticmethod
+    def ing_diff_update(item, model, instance):
+        """
+        Приводит ингредиенты рецепта к списку item, меняя только отличия.
+
+        Возвращает суммы ингредиентов рецепта до изменения
+        или None, если состав не изменился.
+        """
+        amounts = {
+            ingredient['id'].pk: ingredient['amount'] for ingredient in item
+        }
+        old_totals = {}
+        existing = {}
+        removed = []
+        for obj in model.objects.filter(recipe=instance):
+            ingredient_id = obj.ingredient_name_id
+            old_totals[ingredient_id] = (
+                old_totals.get(ingredient_id, 0) + obj.amount
+            )
+            if ingredient_id in amounts and ingredient_id not in existing:
+                existing[ingredient_id] = obj
+            else:
+                removed.append(obj.pk)
+
+        changed = []
+        for ingredient_id, obj in existing.items():
+            if obj.amount != amounts[ingredient_id]:
+                obj.amount = amounts[ingredient_id]
+                changed.append(obj)
+        added = [
+            model(
+                recipe=instance,
+                ingredient_name=ingredient['id'],
+                amount=ingredient['amount']
+            )
+            for ingredient in item
+            if ingredient['id'].pk not in existing
+        ]
+        if not (removed or changed or added):
+            return None
+
+        if removed:
+            model.objects.filter(pk__in=removed).delete()
+        if changed:
+            model.objects.bulk_update(changed, ('amount',))
+        if added:
+            model.objects.bulk_create(added)
+        return old_totals
+
+
+class ImageSrcsetMixin:
+    def get_image_srcset(self, obj):
+        request = self.context.get('request')
+        build_url = request.build_absolute_uri if request else str
+        return image_srcset(obj, build_url)
+
 
 class IsSubscribedMixin:
     def get_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.following.filter(user=request.user).exists()
         return False
 
 
+def _supports_returning():
+    if connection.vendor == 'postgresql':
+        return True
+    return (
+        connection.vendor == 'sqlite'
+        and connection.Database.sqlite_version_info >= (3, 35)
+    )
+
+
+def _columns(model, field_name):
+    meta = model._meta
+    field = meta.get_field(field_name)
+    quote = connection.ops.quote_name
+    return (
+        quote(meta.db_table),
+        quote(meta.get_field('user').column),
+        quote(field.column),
+        quote(meta.pk.column),
+        quote(field.related_model._meta.db_table),
+        quote(field.target_field.column),
+    )
+
+
+def _insert_select(model, user, field_name, item_ids):
+    """
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING для item_ids.
+
+    Возвращает пары (pk новой строки, id объекта) только для вставленных
+    строк. Сигналы не отправляются.
+    """
+    (table, user_column, item_column, pk_column,
+     item_table, item_pk_column) = _columns(model, field_name)
+    obj = model(user=user)
+    # Остальные поля (например, auto_now_add) заполняются как в save().
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key and field.name not in ('user', field_name)
+    ]
+    columns = ''.join(
+        f', {connection.ops.quote_name(field.column)}' for field in fields
+    )
+    params = [
+        field.get_db_prep_save(field.pre_save(obj, add=True), connection)
+        for field in fields
+    ]
+    placeholders = ', %s' * len(fields)
+    ids = ', '.join(['%s'] * len(item_ids))
+    # INSERT ... SELECT ничего не вставляет для несуществующего объекта,
+    # поэтому внешний ключ не нарушается даже при отложенной проверке.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({user_column}, {item_column}{columns}) '
+            f'SELECT %s, {item_pk_column}{placeholders} FROM {item_table} '
+            f'WHERE {item_pk_column} IN ({ids}) '
+            f'ON CONFLICT DO NOTHING RETURNING {pk_column}, {item_column}',
+            (user.pk, *params, *item_ids),
+        )
+        return cursor.fetchall()
+
+
+def _delete_returning(model, user, field_name, item_ids):
+    """
+    DELETE ... RETURNING для связей user -> item_ids.
+
+    Возвращает пары (pk удаленной строки, id объекта). Сигналы
+    не отправляются.
+    """
+    table, user_column, item_column, pk_column, *_ = _columns(
+        model, field_name
+    )
+    ids = ', '.join(['%s'] * len(item_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} '
+            f'WHERE {user_column} = %s AND {item_column} IN ({ids}) '
+            f'RETURNING {pk_column}, {item_column}',
+            (user.pk, *item_ids),
+        )
+        return cursor.fetchall()
+
+
+def insert_ignore(model, user, field_name, item_id):
+    """
+    Добавляет связь user -> item одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает созданный объект или None, если связь уже была
+    или объекта item_id не существует. Так как save() не вызывается,
+    post_save отправляется вручную.
+    """
+    values = {'user': user, f'{field_name}_id': item_id}
+    if not _supports_returning():
+        try:
+            with transaction.atomic():
+                return model.objects.create(**values)
+        except IntegrityError:
+            return None
+
+    rows = _insert_select(model, user, field_name, (item_id,))
+    if not rows:
+        return None
+    obj = model(pk=rows[0][0], **values)
+    obj._state.adding = False
+    post_save.send(
+        sender=model, instance=obj, created=True, update_fields=None,
+        raw=False, using=connection.alias,
+    )
+    return obj
+
+
+def delete_returning(model, user, field_name, item_id):
+    """
+    Удаляет связь user -> item одним DELETE ... RETURNING.
+
+    Возвращает число удаленных строк, post_delete отправляется вручную.
+    """
+    values = {'user': user, f'{field_name}_id': item_id}
+    if not _supports_returning():
+        deleted, _ = model.objects.filter(**values).delete()
+        return deleted
+
+    rows = _delete_returning(model, user, field_name, (item_id,))
+    for pk, _ in rows:
+        post_delete.send(
+            sender=model, instance=model(pk=pk, **values),
+            using=connection.alias,
+        )
+    return len(rows)
+
+
 class AddDeleteMixin:
+    """
+    Добавление и удаление связи пользователя с объектом.
+
+    Запись выполняется одним запросом без предварительной проверки
+    существования объекта. Только если ничего не изменилось, отдельным
+    запросом выясняется, какой ответ вернуть: 404 или 400.
+    """
+
     @staticmethod
     def add_delete(
             request,
-            item,
+            item_id,
+            queryset,
             field_name,
             model,
             serializer_class,
             error_message,
-            success_message
+            success_message,
+            on_add=None,
+            on_delete=None,
     ):
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            raise NotFound
+        user = request.user
+
         if request.method == 'POST':
-            _, created = model.objects.get_or_create(
-                user=request.user,
-                **{field_name: item}
-            )
-            if created:
-                serializer = serializer_class(
-                    item,
-                    context={'request': request}
-                )
+            with transaction.atomic():
+                created = insert_ignore(model, user, field_name, item_id)
+                if created is not None and on_add is not None:
+                    on_add(user, item_id)
+            if created is None:
+                if not queryset.filter(pk=item_id).exists():
+                    raise NotFound
                 return Response(
-                    serializer.data,
-                    status=status.HTTP_201_CREATED
+                    {'error': [error_message['post']]},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
+            serializer = serializer_class(
+                queryset.get(pk=item_id),
+                context={'request': request}
+            )
             return Response(
-                {'error': [error_message['post']]},
-                status=status.HTTP_400_BAD_REQUEST
+                serializer.data,
+                status=status.HTTP_201_CREATED
             )
 
-        model_obj = model.objects.filter(
-            user=request.user,
-            **{field_name: item}
-        )
-        if model_obj.exists():
-            model_obj.delete()
+        with transaction.atomic():
+            deleted = delete_returning(model, user, field_name, item_id)
+            if deleted and on_delete is not None:
+                on_delete(user, item_id)
+        if deleted:
             response_data = {'message': success_message}
             return Response(
                 response_data,
                 status=status.HTTP_200_OK
             )
-
+        if not queryset.filter(pk=item_id).exists():
+            raise NotFound
         return Response(
             {'error': [error_message['delete']]},
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+class BatchAddDeleteMixin:
+    """
+    Пакетное добавление и удаление рецептов (избранное, список покупок).
+
+    Возвращает результат для каждого id:
+    POST - added, exists или not_found, DELETE - removed или not_found.
+
+    Пакет записывается одним INSERT ... RETURNING или DELETE ... RETURNING,
+    счетчики рецептов меняются одним UPDATE на весь пакет.
+    """
+
+    @staticmethod
+    def _add(model, user, recipe_ids):
+        """Возвращает (добавленные id, id, которые уже были добавлены)."""
+        if _supports_returning():
+            added = [
+                pk for _, pk in _insert_select(
+                    model, user, 'recipe', recipe_ids
+                )
+            ]
+            rest = set(recipe_ids) - set(added)
+            existing = set(
+                Recipe.objects.filter(pk__in=rest).values_list('pk', flat=True)
+            ) if rest else set()
+            return added, existing
+        # Без RETURNING проверка существующих строк и вставка разойдутся
+        # при параллельных пакетах, поэтому они идут по очереди.
+        CustomUser.objects.select_for_update().filter(pk=user.pk).exists()
+        found = set(
+            Recipe.objects.filter(pk__in=recipe_ids)
+            .values_list('pk', flat=True)
+        )
+        existing = set(
+            model.objects.filter(user=user, recipe__in=found)
+            .values_list('recipe', flat=True)
+        )
+        added = [pk for pk in recipe_ids if pk in found - existing]
+        model.objects.bulk_create(
+            (model(user=user, recipe_id=pk) for pk in added),
+            ignore_conflicts=True,
+        )
+        return added, existing
+
+    @staticmethod
+    def _remove(model, user, recipe_ids):
+        """Возвращает удаленные id."""
+        if _supports_returning():
+            return [
+                pk for _, pk in _delete_returning(
+                    model, user, 'recipe', recipe_ids
+                )
+            ]
+        CustomUser.objects.select_for_update().filter(pk=user.pk).exists()
+        queryset = model.objects.filter(user=user, recipe__in=recipe_ids)
+        rows = list(queryset.values_list('pk', 'recipe'))
+        # delete() отправляет post_delete, но счетчики меняются
+        # одним вызовом для всего пакета.
+        mark_counted(model, [pk for pk, _ in rows])
+        queryset.delete()
+        return [recipe for _, recipe in rows]
+
+    def batch_add_delete(
+            self,
+            request,
+            model,
+            serializer_class,
+            on_add=None,
+            on_delete=None,
+    ):
+        serializer = serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        user = request.user
+
+        # Сигналы post_save и post_delete не отправляются: счетчики
+        # меняются сразу для всего пакета.
+        with transaction.atomic():
+            if request.method == 'POST':
+                added, existing = self._add(model, user, recipe_ids)
+                change_counter(model, added, 1)
+                if added and on_add is not None:
+                    on_add(user, *added)
+                outcomes = {pk: 'exists' for pk in existing}
+                outcomes.update((pk, 'added') for pk in added)
+            else:
+                removed = self._remove(model, user, recipe_ids)
+                change_counter(model, removed, -1)
+                if removed and on_delete is not None:
+                    on_delete(user, *removed)
+                outcomes = {pk: 'removed' for pk in removed}
+
+        return Response(
+            [
+                {'id': pk, 'status': outcomes.get(pk, 'not_found')}
+                for pk in recipe_ids
+            ],
+            status=status.HTTP_200_OK
+        )
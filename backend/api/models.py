@@ -0,0 +1,28 @@
+from django.db import models
+
+
+class DataVersion(models.Model):
+    """
+    Версия набора данных, по которой процессы узнают об изменениях.
+
+    Хранится в базе, а не в кэше: кэш по умолчанию (LocMemCache)
+    у каждого процесса свой, и смена версии в одном процессе или
+    в команде управления не дошла бы до остальных.
+    """
+
+    name = models.CharField(
+        verbose_name='Набор данных',
+        max_length=50,
+        primary_key=True,
+    )
+    version = models.PositiveBigIntegerField(
+        verbose_name='Версия',
+        default=1,
+    )
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
@@ -0,0 +1,139 @@
+"""
+Поиск N+1 запросов.
+
+SQL-запросы сводятся к форме без значений параметров, и если одна форма
+повторяется больше NPLUSONE_THRESHOLD раз, сообщается поле сериализатора
+и место в коде, откуда пришел запрос.
+
+Режим задается NPLUSONE_DETECTION: 'off' - выключено, 'warn' - запись
+в лог, 'strict' - исключение NPlusOneError (для тестов).
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.fields import Field
+
+logger = logging.getLogger(__name__)
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+_IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+# Локальные переменные обертки connection.execute_wrapper.
+_WRAPPER_LOCALS = {'execute', 'sql', 'params', 'many', 'context'}
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """Форма запроса: значения и списки IN заменены заполнителями."""
+    sql = _LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def _origin():
+    """Поле сериализатора и ближайшая строка кода проекта в стеке."""
+    project_dir = str(settings.BASE_DIR)
+    field = location = None
+    frame = sys._getframe(2)
+    while frame is not None and (field is None or location is None):
+        filename = frame.f_code.co_filename
+        wrapper = _WRAPPER_LOCALS <= frame.f_locals.keys()
+        if (
+            location is None
+            and not wrapper
+            and filename.startswith(project_dir)
+            and 'site-packages' not in filename
+            and filename != __file__
+        ):
+            location = (
+                f'{os.path.relpath(filename, project_dir)}:'
+                f'{frame.f_lineno} in {frame.f_code.co_name}'
+            )
+        obj = frame.f_locals.get('self')
+        if (
+            field is None
+            and isinstance(obj, Field)
+            and obj.parent is not None
+            and obj.field_name
+        ):
+            field = f'{type(obj.parent).__name__}.{obj.field_name}'
+        frame = frame.f_back
+    return field, location
+
+
+class NPlusOneDetector:
+    """Обертка connection.execute_wrapper, считающая формы запросов."""
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or settings.NPLUSONE_THRESHOLD
+        self.counts = Counter()
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = fingerprint(sql)
+        self.counts[shape] += 1
+        if self.counts[shape] == self.threshold + 1:
+            self.origins[shape] = _origin()
+        return execute(sql, params, many, context)
+
+    def problems(self):
+        return [
+            (shape, count, *self.origins[shape])
+            for shape, count in self.counts.most_common()
+            if count > self.threshold
+        ]
+
+    def report(self, label=''):
+        lines = [f'N+1 запросы{f" в {label}" if label else ""}:']
+        for shape, count, field, location in self.problems():
+            lines.append(
+                f'  {count} раз: {shape}\n'
+                f'    поле: {field or "-"}, место: {location or "-"}'
+            )
+        return '\n'.join(lines)
+
+    def check(self, strict, label=''):
+        if not self.problems():
+            return
+        if strict:
+            raise NPlusOneError(self.report(label))
+        logger.warning(self.report(label))
+
+
+@contextmanager
+def detect_n_plus_one(threshold=None, strict=True, label=''):
+    """
+    Проверяет запросы внутри блока with.
+
+    В тестах: with detect_n_plus_one(): client.get(...).
+    """
+    detector = NPlusOneDetector(threshold)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(detector))
+        yield detector
+    detector.check(strict, label)
+
+
+class NPlusOneMiddleware:
+    def __init__(self, get_response):
+        if settings.NPLUSONE_DETECTION not in ('warn', 'strict'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with detect_n_plus_one(
+            strict=settings.NPLUSONE_DETECTION == 'strict',
+            label=f'{request.method} {request.path}',
+        ):
+            return self.get_response(request)
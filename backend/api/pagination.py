@@ -0,0 +1,60 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Курсорная навигация по ленте рецептов.
+
+    Страница выбирается по индексу (pub_date, id) без OFFSET и COUNT(*),
+    поэтому далекие страницы обходятся так же дешево, как первая.
+    """
+
+    ordering = ('-pub_date', '-id')
+
+
+class FeedCursorPagination(CursorPagination):
+    """Курсорная навигация по ленте подписок (FeedItem)."""
+
+    ordering = ('-pub_date', '-id')
+
+
+class RecipePagination(PageNumberPagination):
+    """
+    Постраничная навигация рецептов.
+
+    Параметр ?cursor= (в том числе пустой) включает курсорный режим:
+    ответ содержит next/previous без count. Курсор идет только
+    по (pub_date, id), поэтому вместе с параметрами, задающими другой
+    порядок, он отклоняется.
+    """
+
+    cursor_query_param = RecipeCursorPagination.cursor_query_param
+    ordering_query_params = ('ordering', 'search')
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            conflicts = [
+                param for param in self.ordering_query_params
+                if request.query_params.get(param)
+            ]
+            if conflicts:
+                raise ValidationError({
+                    self.cursor_query_param: (
+                        'Курсорная навигация не поддерживает параметры: '
+                        f'{", ".join(conflicts)}.'
+                    )
+                })
+            self.cursor_paginator = RecipeCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,196 @@
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from api.cache import bump_version, get_version
+from recipes.models import IngredientsAmount, Recipe
+
+PANTRY_VERSION = 'pantry'
+CHANGES_KEY_PREFIX = 'pantry_changes:'
+EMPTY = np.zeros(0, dtype=np.uint32)
+
+
+def record_recipe_changes(*recipe_ids):
+    """Сообщает индексам всех процессов, какие рецепты изменились."""
+    version = bump_version(PANTRY_VERSION)
+    cache.set(
+        f'{CHANGES_KEY_PREFIX}{version}',
+        recipe_ids,
+        timeout=settings.PANTRY_CHANGES_TIMEOUT
+    )
+
+
+class PantryIndex:
+    """
+    Инвертированный индекс ингредиентов в памяти процесса.
+
+    Рецепты пронумерованы подряд, для каждого ингредиента хранится
+    отсортированный массив номеров рецептов с ним. Состояние неизменяемо:
+    изменения собираются в новое состояние, которое подменяет старое.
+
+    При смене версии PANTRY_VERSION индекс перечитывает из базы только
+    рецепты, записанные в журнал изменений record_recipe_changes();
+    если журнал неполон, индекс строится заново.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    @staticmethod
+    def _load(recipe_ids=None):
+        recipes = Recipe.objects.all()
+        ingredients = IngredientsAmount.objects.all()
+        if recipe_ids is not None:
+            recipes = recipes.filter(pk__in=recipe_ids)
+            ingredients = ingredients.filter(recipe__in=recipe_ids)
+        cooking_times = dict(recipes.values_list('id', 'cooking_time'))
+        forward = {}
+        for recipe, ingredient in ingredients.values_list(
+            'recipe', 'ingredient_name'
+        ).distinct().iterator():
+            forward.setdefault(recipe, set()).add(ingredient)
+        return cooking_times, forward
+
+    def _build(self, version):
+        cooking_times, forward = self._load()
+        recipe_ids = np.array(sorted(forward), dtype=np.int64)
+        postings = {}
+        for position, recipe in enumerate(recipe_ids.tolist()):
+            for ingredient in forward[recipe]:
+                postings.setdefault(ingredient, []).append(position)
+        return {
+            'version': version,
+            'recipe_ids': recipe_ids,
+            'positions': {
+                recipe: position
+                for position, recipe in enumerate(recipe_ids.tolist())
+            },
+            'totals': np.array(
+                [len(forward[recipe]) for recipe in recipe_ids.tolist()],
+                dtype=np.int32
+            ),
+            'cooking_times': np.array(
+                [cooking_times[recipe] for recipe in recipe_ids.tolist()],
+                dtype=np.int32
+            ),
+            'forward': {
+                recipe: frozenset(ingredients)
+                for recipe, ingredients in forward.items()
+            },
+            'postings': {
+                ingredient: np.array(positions, dtype=np.uint32)
+                for ingredient, positions in postings.items()
+            },
+        }
+
+    def _apply(self, state, version, recipe_ids):
+        """Новое состояние с перечитанными рецептами recipe_ids."""
+        cooking_times, forward = self._load(recipe_ids)
+        positions = dict(state['positions'])
+        ids = state['recipe_ids']
+        totals = state['totals'].copy()
+        times = state['cooking_times'].copy()
+        new_forward = dict(state['forward'])
+        postings = dict(state['postings'])
+
+        added = [recipe for recipe in forward if recipe not in positions]
+        if added:
+            start = len(ids)
+            ids = np.concatenate((ids, np.array(added, dtype=np.int64)))
+            totals = np.concatenate((totals, np.zeros(len(added), np.int32)))
+            times = np.concatenate((times, np.zeros(len(added), np.int32)))
+            for offset, recipe in enumerate(added):
+                positions[recipe] = start + offset
+
+        for recipe in set(recipe_ids):
+            position = positions.get(recipe)
+            if position is None:
+                continue
+            old = new_forward.pop(recipe, frozenset())
+            new = frozenset(forward.get(recipe, ()))
+            # Удаленный рецепт остается в нумерации, но без ингредиентов.
+            for ingredient in old - new:
+                postings[ingredient] = postings[ingredient][
+                    postings[ingredient] != position
+                ]
+            for ingredient in new - old:
+                postings[ingredient] = np.union1d(
+                    postings.get(ingredient, EMPTY),
+                    np.array((position,), dtype=np.uint32)
+                ).astype(np.uint32)
+            if new:
+                new_forward[recipe] = new
+            totals[position] = len(new)
+            times[position] = cooking_times.get(recipe, 0)
+
+        return {
+            'version': version,
+            'recipe_ids': ids,
+            'positions': positions,
+            'totals': totals,
+            'cooking_times': times,
+            'forward': new_forward,
+            'postings': postings,
+        }
+
+    def _update(self, state, version):
+        if state is None or version < state['version']:
+            return self._build(version)
+        keys = [
+            f'{CHANGES_KEY_PREFIX}{number}'
+            for number in range(state['version'] + 1, version + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return self._build(version)
+        recipe_ids = {
+            recipe for recipes in changes.values() for recipe in recipes
+        }
+        return self._apply(state, version, recipe_ids)
+
+    def _get_state(self):
+        version = get_version(PANTRY_VERSION)
+        state = self._state
+        if state is None or state['version'] != version:
+            with self._lock:
+                state = self._state
+                if state is None or state['version'] != version:
+                    state = self._state = self._update(state, version)
+        return state
+
+    def search(self, ingredient_ids):
+        """
+        Рецепты, в которых есть хотя бы один из ingredient_ids.
+
+        Возвращает список (id рецепта, доля ингредиентов рецепта из
+        ingredient_ids) по убыванию доли, при равной доле - по возрастанию
+        времени приготовления.
+        """
+        state = self._get_state()
+        postings = [
+            state['postings'][ingredient]
+            for ingredient in set(ingredient_ids)
+            if ingredient in state['postings']
+        ]
+        if not postings:
+            return []
+        hits = np.bincount(
+            np.concatenate(postings), minlength=len(state['totals'])
+        )
+        matched = np.flatnonzero(hits)
+        coverage = hits[matched] / state['totals'][matched]
+        order = np.lexsort((
+            state['recipe_ids'][matched],
+            state['cooking_times'][matched],
+            -coverage,
+        ))
+        return list(zip(
+            state['recipe_ids'][matched][order].tolist(),
+            coverage[order].tolist(),
+        ))
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,142 @@
+import csv
+import tempfile
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+SHOPPING_LIST_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """
+    Выбирает формат списка покупок.
+
+    Формат задается параметром ?format=, неизвестный формат - ошибка 406.
+    Без параметра формат выбирается по заголовку Accept, при несовпадении
+    отдается первый (текстовый) формат.
+    """
+
+    def filter_renderers(self, renderers, format):
+        renderers = [
+            renderer for renderer in renderers if renderer.format == format
+        ]
+        if not renderers:
+            raise NotAcceptable(
+                f'Неизвестный формат списка покупок: {format}.'
+            )
+        return renderers
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format = format_suffix or request.query_params.get(
+            self.settings.URL_FORMAT_OVERRIDE
+        )
+        if format:
+            renderers = self.filter_renderers(renderers, format)
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+class ShoppingListRenderer(BaseRenderer, ABC):
+    """
+    Базовый рендерер списка покупок.
+
+    Сам файл формируется генератором stream() по строкам
+    (название, единица измерения, количество), render() используется
+    только для ответов с ошибками: они отдаются в JSON, как в остальном
+    API.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data)
+
+    @abstractmethod
+    def stream(self, ingredients):
+        """Генератор частей файла для строк ingredients."""
+
+
+class TxtShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        yield ', '.join(SHOPPING_LIST_HEADER) + ':\n'
+        for name, unit, amount in ingredients:
+            yield f'- {name}, {amount}, {unit}\n'
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class CsvShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(SHOPPING_LIST_HEADER)
+        for name, unit, amount in ingredients:
+            yield writer.writerow((name, amount, unit))
+
+
+class PdfShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    margin = 50
+    line_height = 18
+
+    def _register_font(self):
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT)
+            )
+
+    def stream(self, ingredients):
+        self._register_font()
+        width, height = A4
+        with tempfile.SpooledTemporaryFile(
+            max_size=STREAM_CHUNK_SIZE
+        ) as pdf_file:
+            pdf = canvas.Canvas(pdf_file, pagesize=A4)
+            pdf.setFont(self.font_name, self.font_size)
+            y = height - self.margin
+            pdf.drawString(self.margin, y, ', '.join(SHOPPING_LIST_HEADER))
+            for name, unit, amount in ingredients:
+                y -= self.line_height
+                if y < self.margin:
+                    pdf.showPage()
+                    pdf.setFont(self.font_name, self.font_size)
+                    y = height - self.margin
+                pdf.drawString(self.margin, y, f'- {name}, {amount}, {unit}')
+            pdf.save()
+
+            pdf_file.seek(0)
+            while True:
+                chunk = pdf_file.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
@@ -0,0 +1,110 @@
+import bisect
+import threading
+
+from api.cache import get_version
+from recipes.models import Ingredient
+
+INGREDIENTS_VERSION = 'ingredients'
+TRIGRAM_SIZE = 3
+
+
+def _trigrams(value):
+    return {
+        value[i:i + TRIGRAM_SIZE]
+        for i in range(len(value) - TRIGRAM_SIZE + 1)
+    }
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Названия хранятся в отсортированном списке (поиск по префиксу
+    бинарным поиском) и в триграммном индексе (поиск по подстроке).
+    Индекс перестраивается при первом обращении после изменения
+    версии INGREDIENTS_VERSION.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _build(self, version):
+        items = sorted(
+            (
+                {'id': pk, 'name': name, 'measurement_unit': unit}
+                for pk, name, unit in Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                )
+            ),
+            key=lambda item: (item['name'].lower(), item['measurement_unit'])
+        )
+        names = [item['name'].lower() for item in items]
+        trigrams = {}
+        for position, name in enumerate(names):
+            for trigram in _trigrams(name):
+                trigrams.setdefault(trigram, []).append(position)
+        return version, items, names, trigrams
+
+    def _get_state(self):
+        version = get_version(INGREDIENTS_VERSION)
+        state = self._state
+        if state is None or state[0] != version:
+            with self._lock:
+                state = self._state
+                if state is None or state[0] != version:
+                    state = self._state = self._build(version)
+        return state
+
+    def all(self):
+        return self._get_state()[1]
+
+    def search(self, query):
+        """
+        Ингредиенты, содержащие query, в порядке релевантности.
+
+        Сначала точное совпадение и совпадения по префиксу названия,
+        затем по началу слова, затем остальные вхождения подстроки.
+        """
+        _, items, names, trigrams = self._get_state()
+        query = query.strip().lower()
+        if not query:
+            return items
+
+        start = bisect.bisect_left(names, query)
+        end = bisect.bisect_left(names, query + '\uffff', lo=start)
+        prefix = sorted(
+            range(start, end), key=lambda position: len(names[position])
+        )
+
+        if len(query) >= TRIGRAM_SIZE:
+            candidates = None
+            for trigram in _trigrams(query):
+                positions = set(trigrams.get(trigram, ()))
+                candidates = (
+                    positions if candidates is None
+                    else candidates & positions
+                )
+                if not candidates:
+                    break
+        else:
+            candidates = range(len(names))
+
+        others = []
+        for position in candidates or ():
+            if start <= position < end:
+                continue
+            index = names[position].find(query)
+            if index < 0:
+                continue
+            word_start = index == 0 or names[position][index - 1] in ' -,('
+            others.append((not word_start, index, position))
+        others.sort()
+
+        return (
+            [items[position] for position in prefix]
+            + [items[position] for _, _, position in others]
+        )
+
+
+ingredient_index = IngredientIndex()
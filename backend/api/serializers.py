@@ -1,21 +1,35 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import UploadedFile
 from django.utils.translation import gettext_lazy as _
 from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from rest_framework.serializers import (ModelSerializer,
+                                        Serializer,
                                         CharField,
                                         SerializerMethodField,
-                                        PrimaryKeyRelatedField,
                                         IntegerField,
-                                        ListField)
+                                        ListField,
+                                        ListSerializer)
 from djoser.serializers import (UserCreateSerializer,
                                 UserSerializer)
-from users.models import CustomUser
+from users.models import CustomUser, Follow
+from recipes.images import schedule_image_variants
+from recipes.similarity import schedule_refresh as schedule_similar_refresh
 from recipes.models import (Recipe,
                             Ingredient,
                             Tag,
-                            IngredientsAmount,)
-
-from api.validators import ingredients_validator, cooking_time_validator
-from api.mixins import IsSubscribedMixin, IngredienteMixin
+                            IngredientsAmount,
+                            ShoppingListIngredient)
+
+from api.cache import recipe_fragment_keys
+from api.validators import (ingredients_validator,
+                            objects_by_ids_validator,
+                            cooking_time_validator,
+                            recipes_limit_validator)
+from api.mixins import (IsSubscribedMixin,
+                        IngredienteMixin,
+                        ImageSrcsetMixin)
 from api.fields import Base64ImageField
 
 
@@ -69,18 +83,20 @@ class CustomUserSerializer(UserCreateSerializer, IsSubscribedMixin):
         return user
 
 
-class ShortRecipeSerializer(ModelSerializer):
+class ShortRecipeSerializer(ModelSerializer, ImageSrcsetMixin):
     """Сериализатор для сокращенного вывода рецепта на странице подписок."""
 
+    image_srcset = SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
 
 
 class SubscriptionPageSerializer(CustomUserSerializer):
     """Сериализатор страницы подписок."""
 
-    recipes = ShortRecipeSerializer(many=True, read_only=True)
+    recipes = SerializerMethodField()
     recipes_count = SerializerMethodField()
 
     class Meta:
@@ -97,9 +113,43 @@ class SubscriptionPageSerializer(CustomUserSerializer):
         )
         read_only_fields = ('__all__',)
 
+    def get_recipes(self, obj):
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            request = self.context.get('request')
+            recipes_limit = recipes_limit_validator(
+                request.query_params.get('recipes_limit') if request else None
+            )
+            recipes = obj.recipes.all()[:recipes_limit]
+        return ShortRecipeSerializer(
+            recipes,
+            many=True,
+            context=self.context
+        ).data
+
     @staticmethod
     def get_recipes_count(obj):
-        return obj.recipes.all().count()
+        return obj.recipes_count
+
+
+class RecipeIdsSerializer(Serializer):
+    """Список id рецептов для пакетного добавления и удаления."""
+
+    recipes = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.MAX_BATCH_RECIPES,
+    )
+
+
+class PantrySerializer(Serializer):
+    """Ингредиенты, которые есть у пользователя."""
+
+    ingredients = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.MAX_PANTRY_INGREDIENTS,
+    )
 
 
 class TagSerializer(ModelSerializer):
@@ -135,7 +185,7 @@ class IngredientSerializer(ModelSerializer):
 class IngredientAddSerializer(ModelSerializer):
     """Сериализатор ингредиентов при создании рецепта."""
 
-    id = PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = IntegerField(min_value=1)
     amount = IntegerField()
 
     class Meta:
@@ -143,17 +193,63 @@ class IngredientAddSerializer(ModelSerializer):
         fields = ('id', 'amount')
 
 
+class RecipeAuthorSerializer(ModelSerializer):
+    """Автор рецепта без полей, зависящих от пользователя."""
+
+    class Meta:
+        model = CustomUser
+        fields = ('email', 'id', 'username', 'first_name', 'last_name')
+
+
+class RecipeFragmentSerializer(ModelSerializer, ImageSrcsetMixin):
+    """Общая для всех пользователей часть представления рецепта."""
+
+    tags = TagSerializer(many=True, read_only=True)
+    author = RecipeAuthorSerializer(read_only=True)
+    ingredients = IngredientSerializer(
+        source='ingredients_amounts', read_only=True, many=True,
+    )
+    image = Base64ImageField()
+    image_srcset = SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id',
+            'tags',
+            'author',
+            'ingredients',
+            'name',
+            'image',
+            'image_srcset',
+            'text',
+            'cooking_time',
+        )
+
+
+class RecipeListSerializer(ListSerializer):
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.represent(list(recipes))
+
+
 class RecipeSerializer(ModelSerializer):
-    """Сериализатор для рецептов."""
+    """
+    Сериализатор для рецептов.
+
+    Общая часть рецепта берется из кэша (RecipeFragmentSerializer),
+    поверх нее добавляются поля текущего пользователя.
+    """
 
     tags = TagSerializer(many=True, read_only=True)
     author = CustomUserSerializer(read_only=True)
     ingredients = IngredientSerializer(
-        read_only=True, many=True,
+        source='ingredients_amounts', read_only=True, many=True,
     )
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
     image = Base64ImageField()
+    image_srcset = SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -166,6 +262,7 @@ class RecipeSerializer(ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_srcset',
             'text',
             'cooking_time',
         )
@@ -173,14 +270,102 @@ class RecipeSerializer(ModelSerializer):
             'in_favorited',
             'is_in_shopping_cart',
         )
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
+
+    def represent(self, recipes):
+        use_cache = self.context.get('cache_fragments', True)
+        keys = recipe_fragment_keys(recipes)
+        fragments = cache.get_many(keys.values()) if use_cache else {}
+        missing = [
+            recipe for recipe in recipes if keys[recipe.pk] not in fragments
+        ]
+        if missing:
+            prefetch_related_objects(
+                missing,
+                'tags',
+                'author',
+                Prefetch(
+                    'ingredients_amounts',
+                    queryset=IngredientsAmount.objects.select_related(
+                        'ingredient_name'
+                    )
+                ),
+            )
+            # Без request в контексте ссылка на изображение относительная.
+            fresh = {
+                keys[recipe.pk]: dict(RecipeFragmentSerializer(recipe).data)
+                for recipe in missing
+            }
+            if use_cache:
+                cache.set_many(fresh, settings.RECIPE_FRAGMENT_TIMEOUT)
+            fragments.update(fresh)
+
+        return [
+            self.add_user_fields(recipe, fragments[keys[recipe.pk]])
+            for recipe in recipes
+        ]
+
+    def add_user_fields(self, recipe, fragment):
+        request = self.context.get('request')
+        data = {}
+        for name in self.Meta.fields:
+            if name == 'is_favorited':
+                data[name] = self.get_is_favorited(recipe)
+            elif name == 'is_in_shopping_cart':
+                data[name] = self.get_is_in_shopping_cart(recipe)
+            elif name == 'author' and fragment['author'] is not None:
+                data[name] = {
+                    **fragment['author'],
+                    'is_subscribed': self.get_author_is_subscribed(recipe),
+                }
+            elif name == 'image' and fragment['image'] and request:
+                data[name] = request.build_absolute_uri(fragment['image'])
+            elif name == 'image_srcset' and fragment[name] and request:
+                data[name] = {
+                    ext: self.absolute_srcset(request, srcset)
+                    for ext, srcset in fragment[name].items()
+                }
+            else:
+                data[name] = fragment[name]
+        return data
+
+    @staticmethod
+    def absolute_srcset(request, srcset):
+        candidates = []
+        for candidate in srcset.split(', '):
+            url, *descriptor = candidate.split(' ')
+            candidates.append(
+                ' '.join((request.build_absolute_uri(url), *descriptor))
+            )
+        return ', '.join(candidates)
+
+    def get_author_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, 'author_is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
+        user = self.context['request'].user
+        if user.is_authenticated:
+            return Follow.objects.filter(
+                user=user, author_id=obj.author_id
+            ).exists()
+        return False
 
     def get_is_favorited(self, obj):
+        is_favorited = getattr(obj, 'is_favorited', None)
+        if is_favorited is not None:
+            return is_favorited
         user = self.context['request'].user
         if user.is_authenticated:
             return obj.in_favorites.filter(user=user).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
         user = self.context['request'].user
         if user.is_authenticated:
             return obj.in_shopping_list.filter(user=user).exists()
@@ -190,10 +375,7 @@ class RecipeSerializer(ModelSerializer):
 class RecipeCreateSerializer(ModelSerializer, IngredienteMixin):
     """Сериализатор для создания рецептов."""
 
-    tags = PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = ListField(child=IntegerField(min_value=1))
     author = CustomUserSerializer(read_only=True)
     ingredients = ListField(child=IngredientAddSerializer())
     image = Base64ImageField()
@@ -211,10 +393,26 @@ class RecipeCreateSerializer(ModelSerializer, IngredienteMixin):
             'cooking_time',
         )
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Хранилище перемещает временный файл изображения, поэтому
+            # он закрывается сразу, не дожидаясь сборщика мусора.
+            image = self.validated_data.get('image')
+            if isinstance(image, UploadedFile):
+                image.close()
+
     def to_representation(self, instance):
+        # Изображение еще обрабатывается в фоне, а updated_at экземпляра
+        # может отставать от базы, поэтому ответ на запись строится
+        # без кэша.
         serializer = RecipeSerializer(
             instance,
-            context={'request': self.context.get('request')}
+            context={
+                'request': self.context.get('request'),
+                'cache_fragments': False,
+            }
         )
         return serializer.data
 
@@ -223,6 +421,20 @@ class RecipeCreateSerializer(ModelSerializer, IngredienteMixin):
         tags = data.get('tags')
         ingredients = data.get('ingredients')
         ingredients_validated = ingredients_validator(ingredients)
+
+        # Все id проверяются одним запросом на каждую модель.
+        ingredient_objects = objects_by_ids_validator(
+            Ingredient.objects.all(),
+            [ingredient['id'] for ingredient in ingredients_validated],
+            'ingredients',
+        )
+        for ingredient in ingredients_validated:
+            ingredient['id'] = ingredient_objects[ingredient['id']]
+        if tags is not None:
+            tag_objects = objects_by_ids_validator(
+                Tag.objects.all(), tags, 'tags'
+            )
+            tags = [tag_objects[pk] for pk in dict.fromkeys(tags)]
         cooking_time = data.get('cooking_time')
         cooking_time_validator(cooking_time)
 
@@ -248,6 +460,8 @@ class RecipeCreateSerializer(ModelSerializer, IngredienteMixin):
 
         request = self.context['request']
         recipe.author = request.user
+        schedule_image_variants(recipe)
+        schedule_similar_refresh(recipe)
         return recipe
 
     @transaction.atomic
@@ -255,13 +469,26 @@ class RecipeCreateSerializer(ModelSerializer, IngredienteMixin):
         ingredients = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
         instance = super().update(recipe, validated_data)
+        features_changed = False
 
         if ingredients is not None:
-            IngredientsAmount.objects.filter(recipe=recipe).delete()
-            self.ing_create_update(ingredients, IngredientsAmount, instance)
+            old_totals = self.ing_diff_update(
+                ingredients, IngredientsAmount, instance
+            )
+            if old_totals is not None:
+                features_changed = True
+                ShoppingListIngredient.objects.recipe_changed(
+                    recipe, old_totals
+                )
 
         if tags_data is not None:
-            instance.tags.clear()
-            instance.tags.set(tags_data)
-
+            old_tags = set(instance.tags.values_list('pk', flat=True))
+            if old_tags != {tag.pk for tag in tags_data}:
+                features_changed = True
+                instance.tags.set(tags_data)
+
+        if 'image' in validated_data:
+            schedule_image_variants(instance)
+        if features_changed:
+            schedule_similar_refresh(instance)
         return recipe
@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from api.cache import (RECIPE_FRAGMENTS_VERSION, bump_version,
+                       touch_author_recipes, touch_recipes)
+from api.pantry import record_recipe_changes
+from api.search import INGREDIENTS_VERSION
+from api.serializers import RecipeAuthorSerializer
+from api.snapshots import TAGS_VERSION
+from recipes.models import Ingredient, IngredientsAmount, Recipe, Tag
+from recipes.transactions import is_deleted, on_commit_once, pending
+from users.models import CustomUser
+
+# Ключи id рецептов, собранных за транзакцию: изменения для журнала
+# индекса и рецепты с уже обновленным updated_at.
+RECIPE_CHANGES = 'recipe_changes'
+TOUCHED_RECIPES = 'touched_recipes'
+# Поля пользователя в представлении рецепта.
+AUTHOR_FIELDS = tuple(
+    field for field in RecipeAuthorSerializer.Meta.fields if field != 'id'
+)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    transaction.on_commit(lambda: bump_version(INGREDIENTS_VERSION))
+    transaction.on_commit(lambda: bump_version(RECIPE_FRAGMENTS_VERSION))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    transaction.on_commit(lambda: bump_version(TAGS_VERSION))
+    transaction.on_commit(lambda: bump_version(RECIPE_FRAGMENTS_VERSION))
+
+
+@receiver(pre_save, sender=CustomUser)
+def check_author_fields(instance, update_fields=None, **kwargs):
+    # Вход в систему, смена пароля и регистрация не меняют рецептов.
+    instance._author_changed = False
+    if instance.pk is None or (
+        update_fields is not None
+        and not set(update_fields) & set(AUTHOR_FIELDS)
+    ):
+        return
+    old = CustomUser.objects.filter(pk=instance.pk).values(
+        *AUTHOR_FIELDS
+    ).first()
+    instance._author_changed = old is not None and any(
+        getattr(instance, field) != value for field, value in old.items()
+    )
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_author(instance, **kwargs):
+    if getattr(instance, '_author_changed', False):
+        touch_author_recipes(instance.pk)
+
+
+@receiver(pre_delete, sender=CustomUser)
+def invalidate_deleted_author(instance, **kwargs):
+    # Рецепты остаются без автора: author обнуляется без сигналов.
+    touch_author_recipes(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    # Ключ кэша представления меняется вместе с updated_at при save().
+    on_commit_once(RECIPE_CHANGES, record_recipe_changes, instance.pk)
+
+
+@receiver(pre_delete, sender=Recipe)
+def invalidate_deleted_recipe(instance, **kwargs):
+    # Строки ингредиентов удаляются каскадом до post_delete рецепта.
+    on_commit_once(RECIPE_CHANGES, record_recipe_changes, instance.pk)
+
+
+@receiver((post_save, post_delete), sender=IngredientsAmount)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    recipe_id = instance.recipe_id
+    if is_deleted(Recipe, recipe_id):
+        return
+    if recipe_id not in pending(TOUCHED_RECIPES):
+        touch_recipes(recipe_id)
+        on_commit_once(TOUCHED_RECIPES, None, recipe_id)
+    on_commit_once(RECIPE_CHANGES, record_recipe_changes, recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipe_ids = (instance.pk,)
+    elif pk_set is not None:
+        recipe_ids = tuple(pk_set)
+    else:
+        transaction.on_commit(
+            lambda: bump_version(RECIPE_FRAGMENTS_VERSION)
+        )
+        return
+    touch_recipes(*recipe_ids)
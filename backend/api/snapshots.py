@@ -0,0 +1,76 @@
+import gzip
+import hashlib
+import threading
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from api.cache import get_version
+from api.search import INGREDIENTS_VERSION
+from api.serializers import IngredientSearchSerializer, TagSerializer
+from recipes.models import Ingredient, Tag
+
+TAGS_VERSION = 'tags'
+
+
+class Snapshot:
+    """
+    Готовый JSON-ответ со справочными данными в памяти процесса.
+
+    Хранит тело ответа в исходном и сжатом виде вместе с ETag и
+    перестраивается при первом обращении после смены версии данных.
+    """
+
+    content_type = 'application/json'
+
+    def __init__(self, version_name, build):
+        self.version_name = version_name
+        self.build = build
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _make_state(self, version):
+        body = JSONRenderer().render(self.build())
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        return (
+            version,
+            (body, f'"{etag}"'),
+            (gzip.compress(body, mtime=0), f'"{etag}-gzip"'),
+        )
+
+    def _get_state(self):
+        version = get_version(self.version_name)
+        state = self._state
+        if state is None or state[0] != version:
+            with self._lock:
+                state = self._state
+                if state is None or state[0] != version:
+                    state = self._state = self._make_state(version)
+        return state
+
+    def response(self, request):
+        _, plain, compressed = self._get_state()
+        use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        body, etag = compressed if use_gzip else plain
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type=self.content_type)
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+tags_snapshot = Snapshot(
+    TAGS_VERSION,
+    lambda: TagSerializer(Tag.objects.all(), many=True).data,
+)
+ingredients_snapshot = Snapshot(
+    INGREDIENTS_VERSION,
+    lambda: IngredientSearchSerializer(
+        Ingredient.objects.all(), many=True
+    ).data,
+)
@@ -2,7 +2,8 @@ from django.core.exceptions import ValidationError
 from foodgram.settings import (MIN_INGR_AMOUNT,
                                MAX_INGR_AMOUNT,
                                MAX_COOK_TIME,
-                               MIN_COOK_TIME)
+                               MIN_COOK_TIME,
+                               MAX_RECIPES_LIMIT)
 
 
 def ingredients_validator(ingredients):
@@ -34,6 +35,25 @@ def ingredients_validator(ingredients):
     return ingredients
 
 
+def objects_by_ids_validator(queryset, ids, field_name):
+    """
+    Загружает объекты по списку id одним запросом.
+
+    Возвращает словарь {id: объект}, отсутствующие id перечисляются
+    в одной ошибке.
+    """
+    objects = queryset.in_bulk(set(ids))
+    missing = [pk for pk in dict.fromkeys(ids) if pk not in objects]
+    if missing:
+        raise ValidationError({
+            field_name: [
+                'Не найдены объекты с id: '
+                f'{", ".join(map(str, missing))}.'
+            ]
+        })
+    return objects
+
+
 def cooking_time_validator(cooking_time):
     """
 
@@ -46,3 +66,18 @@ def cooking_time_validator(cooking_time):
                 f'до {MAX_COOK_TIME} минут.'
             ]
         })
+
+
+def recipes_limit_validator(recipes_limit):
+    """
+    Приводит параметр recipes_limit к допустимому значению.
+
+    Некорректные и отсутствующие значения заменяются максимальным лимитом.
+    """
+    try:
+        recipes_limit = int(recipes_limit)
+    except (TypeError, ValueError):
+        return MAX_RECIPES_LIMIT
+    if recipes_limit < 1:
+        return MAX_RECIPES_LIMIT
+    return min(recipes_limit, MAX_RECIPES_LIMIT)
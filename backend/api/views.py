@@ -1,6 +1,7 @@
-from django.http import HttpResponse
-from django.db.models import Sum
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.db.models import (BooleanField, Exists, OuterRef,
+                              Prefetch, Value, prefetch_related_objects)
 from django.conf import settings
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, status
@@ -13,20 +14,34 @@ from djoser.serializers import SetPasswordSerializer
 
 from users.models import CustomUser, Follow
 from recipes.models import (Tag, Ingredient, Recipe,
-                            Favorite, ShoppingList, IngredientsAmount)
+                            Favorite, ShoppingList,
+                            ShoppingListIngredient, FeedItem,
+                            SimilarRecipe)
 from api.serializers import (CustomUserSerializer,
                              IngredientSearchSerializer,
                              TagSerializer,
                              RecipeSerializer,
                              RecipeCreateSerializer,
                              SubscriptionPageSerializer,
-                             ShortRecipeSerializer)
-from api.mixins import AddDeleteMixin
+                             ShortRecipeSerializer,
+                             RecipeIdsSerializer,
+                             PantrySerializer)
+from api.metrics import MetricsViewMixin
+from api.mixins import AddDeleteMixin, BatchAddDeleteMixin
 from api.filters import RecipeFilter, IngredientFilter
+from api.pagination import FeedCursorPagination, RecipePagination
 from api.permissions import AuthorOrReadOnly
+from api.pantry import pantry_index
+from api.search import ingredient_index
+from api.snapshots import ingredients_snapshot, tags_snapshot
+from api.renderers import (ShoppingListNegotiation,
+                           TxtShoppingListRenderer,
+                           CsvShoppingListRenderer,
+                           PdfShoppingListRenderer)
+from api.validators import recipes_limit_validator
 
 
-class BasePermissionViewSet(viewsets.ModelViewSet):
+class BasePermissionViewSet(MetricsViewMixin, viewsets.ModelViewSet):
     def get_permissions(self):
         if self.action in ('list', 'retrieve'):
             return [AllowAny()]
@@ -35,7 +50,7 @@ class BasePermissionViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
 
-class CustomUserViewSet(UserViewSet, AddDeleteMixin):
+class CustomUserViewSet(MetricsViewMixin, UserViewSet, AddDeleteMixin):
     pagination_class = PageNumberPagination
     queryset = CustomUser.objects.all()
 
@@ -44,6 +59,15 @@ class CustomUserViewSet(UserViewSet, AddDeleteMixin):
             return SetPasswordSerializer
         return CustomUserSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        return queryset
+
     @action(
         detail=True,
         methods=('post', 'delete'),
@@ -51,8 +75,6 @@ class CustomUserViewSet(UserViewSet, AddDeleteMixin):
         permission_classes=(IsAuthenticated,),
     )
     def subscribe_unsubscribe(self, request, id=None):
-        author = get_object_or_404(CustomUser, id=id)
-
         return self.add_delete(
             request=request,
             model=Follow,
@@ -62,7 +84,8 @@ class CustomUserViewSet(UserViewSet, AddDeleteMixin):
                 'delete': 'Вы не подписаны на автора.'
             },
             success_message='Вы успешно отписались от автора.',
-            item=author,
+            item_id=id,
+            queryset=CustomUser.objects.all(),
             field_name='author'
         )
 
@@ -74,8 +97,27 @@ class CustomUserViewSet(UserViewSet, AddDeleteMixin):
     )
     def my_subscriptions(self, request):
         user = request.user
-        subscriptions = CustomUser.objects.filter(following__user=user)
+        recipes_limit = recipes_limit_validator(
+            request.query_params.get('recipes_limit')
+        )
+        subscriptions = (
+            CustomUser.objects
+            .filter(following__user=user)
+            .annotate(
+                is_subscribed=Value(True, output_field=BooleanField()),
+            )
+        )
         paginated_subscriptions = self.paginate_queryset(subscriptions)
+        # Первые N рецептов каждого автора страницы - одним запросом
+        # с ROW_NUMBER() по авторам.
+        prefetch_related_objects(paginated_subscriptions, Prefetch(
+            'recipes',
+            queryset=Recipe.objects.latest_by_author(
+                [author.pk for author in paginated_subscriptions],
+                recipes_limit,
+            ),
+            to_attr='limited_recipes',
+        ))
         serializer = (
             SubscriptionPageSerializer(
                 paginated_subscriptions,
@@ -93,25 +135,71 @@ class IngredientViewSet(BasePermissionViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is None:
+            return ingredients_snapshot.response(request)
+        # Поиск идет по индексу в памяти, без запросов к базе.
+        return Response(ingredient_index.search(name))
+
 
 class TagViewSet(BasePermissionViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return tags_snapshot.response(request)
+
 
-class RecipeViewSet(viewsets.ModelViewSet, AddDeleteMixin):
+class RecipeViewSet(MetricsViewMixin,
+                    viewsets.ModelViewSet,
+                    AddDeleteMixin,
+                    BatchAddDeleteMixin):
     queryset = Recipe.objects.all()
-    pagination_class = PageNumberPagination
+    pagination_class = RecipePagination
     permission_classes = (AuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'feed', 'pantry'):
+            return queryset
+
+        # Связанные объекты подгружаются сериализатором только для
+        # рецептов, которых нет в кэше.
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                author_is_subscribed=Value(
+                    False, output_field=BooleanField()
+                ),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        )
+
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed', 'pantry'):
             return RecipeSerializer
         return RecipeCreateSerializer
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ShoppingListIngredient.objects.recipe_deleted(instance)
+        instance.delete()
+
     @action(
         detail=True,
         methods=('post', 'delete'),
@@ -119,7 +207,6 @@ class RecipeViewSet(viewsets.ModelViewSet, AddDeleteMixin):
         permission_classes=(IsAuthenticated,)
     )
     def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
         return self.add_delete(
             request=request,
             model=Favorite,
@@ -129,7 +216,8 @@ class RecipeViewSet(viewsets.ModelViewSet, AddDeleteMixin):
                 'delete': 'Рецепт не в избранном.'
             },
             success_message='Рецепт успешно удален из избранного.',
-            item=recipe,
+            item_id=pk,
+            queryset=Recipe.objects.all(),
             field_name='recipe'
         )
 
@@ -140,7 +228,6 @@ class RecipeViewSet(viewsets.ModelViewSet, AddDeleteMixin):
         permission_classes=(IsAuthenticated,)
     )
     def shopping_list(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
         return self.add_delete(
             request=request,
             model=ShoppingList,
@@ -150,51 +237,160 @@ class RecipeViewSet(viewsets.ModelViewSet, AddDeleteMixin):
                 'delete': 'Рецепт не в списке покупок.'
             },
             success_message='Рецепт успешно удален из списка покупок.',
-            item=recipe,
-            field_name='recipe'
+            item_id=pk,
+            queryset=Recipe.objects.all(),
+            field_name='recipe',
+            on_add=ShoppingListIngredient.objects.add_recipes,
+            on_delete=ShoppingListIngredient.objects.remove_recipes,
         )
 
     @action(
+        detail=True,
         methods=('get',),
+        url_path='similar',
+        permission_classes=(AllowAny,)
+    )
+    def similar(self, request, pk=None):
+        """Похожие рецепты из заранее рассчитанной таблицы."""
+        recipe = self.get_object()
+        similar_ids = list(
+            SimilarRecipe.objects.filter(recipe=recipe)
+            .order_by('-score')
+            .values_list('similar', flat=True)
+        )
+        recipes = Recipe.objects.in_bulk(similar_ids)
+        serializer = ShortRecipeSerializer(
+            [recipes[pk] for pk in similar_ids if pk in recipes],
+            many=True,
+            context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(
         detail=False,
-        url_path='download_shopping_cart',
+        methods=('get',),
+        url_path='pantry',
+        permission_classes=(AllowAny,)
+    )
+    def pantry(self, request):
+        """
+        Что приготовить из имеющихся ингредиентов.
+
+        Ингредиенты передаются как ?ingredients=1,2&ingredients=3.
+        Рецепты упорядочены по доле имеющихся ингредиентов (coverage),
+        затем по времени приготовления.
+        """
+        serializer = PantrySerializer(data={'ingredients': [
+            value
+            for values in request.query_params.getlist('ingredients')
+            for value in values.split(',') if value
+        ]})
+        serializer.is_valid(raise_exception=True)
+        ranking = pantry_index.search(
+            serializer.validated_data['ingredients']
+        )
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(ranking, request, self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe for recipe, _ in page]
+        )
+        page = [
+            (recipes[recipe], coverage)
+            for recipe, coverage in page if recipe in recipes
+        ]
+        data = self.get_serializer(
+            [recipe for recipe, _ in page], many=True
+        ).data
+        for item, (_, coverage) in zip(data, page):
+            item['coverage'] = round(coverage, 4)
+        return paginator.get_paginated_response(data)
+
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='feed',
         permission_classes=(IsAuthenticated,)
     )
+    def feed(self, request):
+        """Рецепты авторов из подписок, от новых к старым."""
+        paginator = FeedCursorPagination()
+        items = paginator.paginate_queryset(
+            FeedItem.objects.filter(user=request.user), request, self
+        )
+        recipes = self.get_queryset().in_bulk(
+            [item.recipe_id for item in items]
+        )
+        serializer = self.get_serializer(
+            [recipes[item.recipe_id] for item in items
+             if item.recipe_id in recipes],
+            many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='favorite',
+        permission_classes=(IsAuthenticated,)
+    )
+    def favorite_batch(self, request):
+        return self.batch_add_delete(
+            request=request,
+            model=Favorite,
+            serializer_class=RecipeIdsSerializer,
+        )
+
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='shopping_cart',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_list_batch(self, request):
+        return self.batch_add_delete(
+            request=request,
+            model=ShoppingList,
+            serializer_class=RecipeIdsSerializer,
+            on_add=ShoppingListIngredient.objects.add_recipes,
+            on_delete=ShoppingListIngredient.objects.remove_recipes,
+        )
+
+    @action(
+        methods=('get',),
+        detail=False,
+        url_path='download_shopping_cart',
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(TxtShoppingListRenderer,
+                          CsvShoppingListRenderer,
+                          PdfShoppingListRenderer),
+        content_negotiation_class=ShoppingListNegotiation,
+    )
     def download_shopping_cart_list(self, request):
         user = request.user
         if not user.shopping_list.exists():
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        shopping_list = (
-            ShoppingList.objects
-            .filter(user=user)
-            .values_list('recipe__pk', flat=True)
-        )
         ingredients = (
-            IngredientsAmount.objects
-            .filter(recipe__in=shopping_list)
-            .values(
-                'ingredient_name__name',
-                'ingredient_name__measurement_unit'
+            ShoppingListIngredient.objects
+            .filter(user=user)
+            .values_list(
+                'ingredient__name',
+                'ingredient__measurement_unit',
+                'amount'
             )
-            .annotate(sum_amount=Sum('amount'))
-        )
-        ingredient_totals = {
-            ingredient['ingredient_name__name']: {
-                'amount': ingredient['sum_amount'],
-                'unit': ingredient['ingredient_name__measurement_unit']
-            }
-            for ingredient in ingredients
-        }
-
-        # Создаем динамический файл TXT
-        response = HttpResponse(content_type=settings.CONTENT_TYPE)
-        response['Content-Disposition'] = (
-            f'attachment; filename={settings.SHOPPING_LIST_FILENAME}'
+            .order_by('ingredient__name', 'ingredient__measurement_unit')
         )
 
-        response.write('Ингредиент, Количество, Единица измерения:\n')
-
-        for ingredient, data in ingredient_totals.items():
-            line = f'- {ingredient}, {data["amount"]}, {data["unit"]}\n'
-            response.write(line)
+        # Строки читаются курсором и сразу отдаются клиенту.
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator()),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = (
+            'attachment; '
+            f'filename={settings.SHOPPING_LIST_FILENAME}.{renderer.format}'
+        )
         return response
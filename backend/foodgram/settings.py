@@ -17,6 +17,13 @@ SECRET_KEY = os.getenv(
 
 DEBUG = os.getenv('DJANGO_DEBUG') == 'True'
 
+# Заголовок Server-Timing с временем SQL, обработчика и рендеринга.
+SERVER_TIMING = os.getenv('SERVER_TIMING', str(DEBUG)) == 'True'
+
+# Поиск N+1 запросов: off, warn (в лог) или strict (исключение).
+NPLUSONE_DETECTION = os.getenv('NPLUSONE_DETECTION', 'off')
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
+
 ALLOWED_HOSTS = [
     '51.250.19.103',
     '127.0.0.1',
@@ -31,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_filters',
     'rest_framework',
     'users.apps.UsersConfig',
@@ -41,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,7 +82,9 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.getenv(
+            'DB_ENGINE', 'django.db.backends.postgresql'
+        ),
         'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
         'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'foodgram_password'),
@@ -81,13 +93,56 @@ DATABASES = {
     }
 }
 
+# LocMemCache у каждого процесса свой: при нескольких процессах gunicorn
+# задайте общий кэш (CACHE_BACKEND, например
+# django.core.cache.backends.memcached.PyMemcacheCache), иначе каждый
+# процесс строит и хранит представления рецептов отдельно. Корректность
+# от этого не зависит: версии данных хранятся в базе, а ключи
+# представлений рецептов содержат updated_at.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
+}
+
+RECIPE_FRAGMENT_TIMEOUT = 60 * 60 * 24
+PANTRY_CHANGES_TIMEOUT = 60 * 60 * 24
+
 MIN_INGR_AMOUNT = 1
 MAX_INGR_AMOUNT = 999
 MIN_COOK_TIME = 1
 MAX_COOK_TIME = 600
-
-SHOPPING_LIST_FILENAME = 'shopping_list.txt'
-CONTENT_TYPE = 'text/plain'
+MAX_RECIPES_LIMIT = 100
+MAX_BATCH_RECIPES = 100
+MAX_PANTRY_INGREDIENTS = 500
+FEED_BACKFILL_LIMIT = 500
+SIMILAR_RECIPES_TOP_K = 10
+# Потоки фонового обновления похожих рецептов (0 - только командой).
+SIMILAR_RECIPES_WORKERS = int(os.getenv('SIMILAR_RECIPES_WORKERS', 1))
+TRENDING_HALF_LIFE_HOURS = 72
+TRENDING_MIN_SCORE = 0.01
+# События моложе этого срока ждут следующего пересчета: транзакция,
+# начатая раньше, могла еще не закоммититься.
+TRENDING_SETTLE_SECONDS = 300
+TRENDING_WEIGHTS = {'favorite': 1.0, 'shopping_list': 1.0}
+SEARCH_CONFIG = 'russian'
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+SHOPPING_LIST_FILENAME = 'shopping_list'
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
 
 AUTH_PASSWORD_VALIDATORS = [
     {
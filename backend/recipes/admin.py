@@ -1,5 +1,4 @@
 from django.contrib import admin
-from django.db import models
 
 from recipes.permissions import AdminPermissions
 from recipes.models import (Recipe,
@@ -22,16 +21,10 @@ class RecipesAdmin(AdminPermissions):
     inlines = (IngredientsAmountInline,)
     readonly_fields = ('favorite_count',)
 
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        queryset = queryset.annotate(
-            favorite_count=models.Count('in_favorites')
-        )
-        return queryset
-
     def favorite_count(self, obj):
-        return obj.in_favorites.count()
+        return obj.favorites_count
 
+    favorite_count.admin_order_field = 'favorites_count'
     favorite_count.short_description = 'Число добавлений в избранное'
 
 
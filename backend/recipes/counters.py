@@ -0,0 +1,100 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingList
+from recipes.transactions import on_commit_once, pending
+from users.models import CustomUser
+
+# Счетчик: (модель, поле счетчика, модель строк, поле связи со счетчиком).
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingList, 'recipe'),
+    (CustomUser, 'recipes_count', Recipe, 'author'),
+)
+COUNTER_FIELDS = {
+    related_model: (model, field, related_field)
+    for model, field, related_model, related_field in COUNTERS
+}
+
+
+def change_counter(related_model, object_ids, delta):
+    """
+    Изменяет счетчик на delta для каждого из object_ids.
+
+    object_ids могут повторяться: каждое вхождение меняет счетчик
+    на delta. Обновление выполняется одним UPDATE ... SET field = field + n
+    на каждое значение n, поэтому не теряет параллельных изменений.
+    """
+    model, field, _ = COUNTER_FIELDS[related_model]
+    changes = {}
+    for object_id in object_ids:
+        if object_id is not None:
+            changes[object_id] = changes.get(object_id, 0) + delta
+    by_change = {}
+    for object_id, change in changes.items():
+        by_change.setdefault(change, []).append(object_id)
+    for change, ids in by_change.items():
+        queryset = model.objects.filter(pk__in=ids)
+        if change < 0:
+            # Счетчик не уходит в минус, даже если успел разойтись.
+            queryset = queryset.filter(**{f'{field}__gte': -change})
+        queryset.update(**{field: F(field) + change})
+
+
+def _counted_key(related_model):
+    return f'counted:{related_model._meta.label}'
+
+
+def mark_counted(related_model, pks):
+    """
+    Отмечает удаляемые строки, чьи счетчики меняет вызывающий код.
+
+    Обработчик post_delete пропускает их до конца транзакции, и
+    пакет можно удалить через delete() с одним change_counter().
+    """
+    on_commit_once(_counted_key(related_model), None, *pks)
+
+
+def is_counted(related_model, pk):
+    """Учтена ли строка related_model с pk в счетчиках заранее."""
+    return pk in pending(_counted_key(related_model))
+
+
+def actual_count(related_model, related_field):
+    """Выражение с фактическим числом связанных строк для OuterRef('pk')."""
+    return Coalesce(
+        Subquery(
+            related_model.objects
+            .filter(**{related_field: OuterRef('pk')})
+            .order_by()
+            .values(related_field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+def reconcile_counters(dry_run=False, batch_size=1000):
+    """
+    Сверяет счетчики с фактическим числом строк и исправляет расхождения.
+
+    Возвращает словарь {'модель.поле': число разошедшихся объектов}.
+    """
+    result = {}
+    for model, field, related_model, related_field in COUNTERS:
+        actual = actual_count(related_model, related_field)
+        drifted = list(
+            model.objects
+            .annotate(actual=actual)
+            .exclude(**{field: F('actual')})
+            .values_list('pk', flat=True)
+        )
+        result[f'{model._meta.label}.{field}'] = len(drifted)
+        if dry_run:
+            continue
+        for start in range(0, len(drifted), batch_size):
+            model.objects.filter(
+                pk__in=drifted[start:start + batch_size]
+            ).update(**{field: actual})
+    return result
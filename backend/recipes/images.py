@@ -0,0 +1,146 @@
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, features
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipes/images/variants'
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def supported_formats():
+    return {
+        ext: image_format for ext, image_format in VARIANT_FORMATS.items()
+        if ext != 'webp' or features.check('webp')
+    }
+
+
+def build_variants(recipe):
+    """
+    Сохраняет уменьшенные копии изображения рецепта.
+
+    Возвращает описание вариантов для Recipe.image_variants:
+    {'source': имя исходного файла, 'width': ширина исходного файла,
+    'webp': [[ширина, имя файла], ...], ...}.
+    """
+    storage = recipe.image.storage
+    with recipe.image.open('rb') as file:
+        image = Image.open(file)
+        image.load()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    stem = PurePosixPath(recipe.image.name).stem
+    formats = supported_formats()
+    variants = {'source': recipe.image.name, 'width': image.width}
+    variants.update({ext: [] for ext in formats})
+    for width in sorted(settings.IMAGE_VARIANT_WIDTHS):
+        if width >= image.width:
+            break
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for ext, image_format in formats.items():
+            buffer = io.BytesIO()
+            resized.save(
+                buffer, image_format, quality=settings.IMAGE_VARIANT_QUALITY
+            )
+            name = storage.save(
+                f'{VARIANTS_DIR}/{stem}_{width}.{ext}',
+                ContentFile(buffer.getvalue()),
+            )
+            variants[ext].append([width, name])
+    return variants
+
+
+def delete_variants(recipe, variants):
+    for ext in VARIANT_FORMATS:
+        for _, name in variants.get(ext, ()):
+            recipe.image.storage.delete(name)
+
+
+def process_recipe_image(recipe_id):
+    from recipes.models import Recipe
+
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    old_variants = recipe.image_variants or {}
+    if old_variants.get('source') == recipe.image.name:
+        return
+
+    recipe.image_variants = build_variants(recipe)
+    # Изображение могло смениться, пока строились варианты.
+    if Recipe.objects.filter(pk=recipe_id, image=recipe.image.name).exists():
+        recipe.save(update_fields=('image_variants',))
+        delete_variants(recipe, old_variants)
+    else:
+        delete_variants(recipe, recipe.image_variants)
+
+
+def _run_in_worker(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось обработать изображение рецепта %s', recipe_id
+        )
+    finally:
+        connection.close()
+
+
+def schedule_image_variants(recipe):
+    """
+    Ставит обработку изображения рецепта в очередь после коммита.
+
+    При IMAGE_WORKERS = 0 обработка выполняется сразу в текущем потоке.
+    """
+
+    def submit():
+        if not settings.IMAGE_WORKERS:
+            process_recipe_image(recipe.pk)
+            return
+        global _executor
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_WORKERS,
+                    thread_name_prefix='recipe-images',
+                )
+        _executor.submit(_run_in_worker, recipe.pk)
+
+    transaction.on_commit(submit)
+
+
+def image_srcset(recipe, build_url):
+    """
+    Значения srcset по форматам.
+
+    Пока варианты не готовы, в srcset указывается исходное изображение.
+    """
+    if not recipe.image:
+        return None
+    original = build_url(recipe.image.url)
+    variants = recipe.image_variants or {}
+    if variants.get('source') != recipe.image.name:
+        variants = {}
+    storage = recipe.image.storage
+    srcset = {}
+    for ext in VARIANT_FORMATS:
+        candidates = [
+            f'{build_url(storage.url(name))} {width}w'
+            for width, name in variants.get(ext, ())
+        ]
+        if candidates:
+            candidates.append(f'{original} {variants["width"]}w')
+        srcset[ext] = ', '.join(candidates) if candidates else original
+    return srcset
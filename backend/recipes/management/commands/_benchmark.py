@@ -0,0 +1,262 @@
+"""
+Синтетические данные и замеры для команды benchmark.
+
+Данные вставляются пачками без save() и сигналов, как в fast_loaddata,
+после чего пересчитываются списки покупок, счетчики и ленты.
+"""
+import random
+import tracemalloc
+from contextlib import ExitStack
+from datetime import timedelta
+from itertools import islice
+from time import perf_counter
+
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Max
+from django.core.management.color import no_style
+from django.utils import timezone
+
+from api.cache import bump_version
+from api.pantry import PANTRY_VERSION
+from api.search import INGREDIENTS_VERSION
+from recipes.counters import reconcile_counters
+from recipes.models import (RECIPE_SEARCH_VECTOR,
+                            Favorite,
+                            FeedItem,
+                            Ingredient,
+                            IngredientsAmount,
+                            Recipe,
+                            ShoppingList,
+                            ShoppingListIngredient,
+                            Tag)
+from users.models import CustomUser, Follow
+
+BATCH_SIZE = 5000
+UNITS = ('г', 'кг', 'мл', 'л', 'шт', 'ст. л.', 'ч. л.')
+SEARCH_QUERY = 'ингредиент 1'
+RecipeTags = Recipe.tags.through
+
+# Сценарий: (путь, параметры запроса, запрос от пользователя).
+SCENARIOS = {
+    'recipes_list': ('/api/recipes/', {}, False),
+    'recipes_list_authenticated': ('/api/recipes/', {}, True),
+    'subscriptions': (
+        '/api/users/subscriptions/', {'recipes_limit': 3}, True
+    ),
+    'download_shopping_cart': (
+        '/api/recipes/download_shopping_cart/', {}, True
+    ),
+    'ingredient_search': ('/api/ingredients/', {'name': SEARCH_QUERY}, False),
+}
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries',
+                    'peak_memory_kib')
+
+
+def insert(model, objects):
+    """
+    Вставляет объекты пачками, назначая id подряд.
+
+    raw=True: значения auto_now_add берутся из объектов.
+    """
+    next_id = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    fields = model._meta.concrete_fields
+    objects = iter(objects)
+    count = 0
+    while True:
+        batch = list(islice(objects, BATCH_SIZE))
+        if not batch:
+            return count
+        for obj in batch:
+            obj.pk = next_id
+            next_id += 1
+        size = max(connection.ops.bulk_batch_size(fields, batch), 1)
+        for start in range(0, len(batch), size):
+            model._base_manager._insert(
+                batch[start:start + size],
+                fields=fields,
+                using=DEFAULT_DB_ALIAS,
+                raw=True,
+            )
+        count += len(batch)
+
+
+@transaction.atomic
+def seed(users, follows, recipes, ingredients, recipe_ingredients,
+         cart_size, favorites, tags, random_seed=0):
+    """
+    Заполняет пустую базу синтетическими данными.
+
+    Каждый пользователь подписан на follows авторов, держит в корзине
+    cart_size рецептов и в избранном favorites рецептов. Авторы рецептов
+    выбираются случайно. Возвращает пользователя для замеров.
+    """
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    follows = min(follows, users - 1)
+    cart_size = min(cart_size, recipes)
+    favorites = min(favorites, recipes)
+    recipe_ingredients = min(recipe_ingredients, ingredients)
+
+    insert(CustomUser, (
+        CustomUser(
+            username=f'user{number}',
+            email=f'user{number}@example.com',
+            first_name='Имя',
+            last_name=f'Фамилия {number}',
+            password='!',
+        )
+        for number in range(users)
+    ))
+    insert(Tag, (
+        Tag(name=f'Тег {number}', color=f'#{number:06X}',
+            slug=f'tag-{number}')
+        for number in range(tags)
+    ))
+    insert(Ingredient, (
+        Ingredient(name=f'ингредиент {number}',
+                   measurement_unit=UNITS[number % len(UNITS)])
+        for number in range(ingredients)
+    ))
+    user_ids = list(CustomUser.objects.values_list('pk', flat=True))
+    tag_ids = list(Tag.objects.values_list('pk', flat=True))
+    ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+
+    insert(Recipe, (
+        Recipe(
+            author_id=rng.choice(user_ids),
+            name=f'Рецепт {number}',
+            image='recipes/images/benchmark.jpg',
+            text='Описание рецепта.',
+            cooking_time=rng.randint(1, 120),
+            pub_date=now - timedelta(minutes=number),
+            updated_at=now,
+        )
+        for number in range(recipes)
+    ))
+    recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+    insert(RecipeTags, (
+        RecipeTags(recipe_id=recipe, tag_id=tag)
+        for recipe in recipe_ids
+        for tag in rng.sample(tag_ids, min(rng.randint(1, 3), len(tag_ids)))
+    ))
+    insert(IngredientsAmount, (
+        IngredientsAmount(recipe_id=recipe, ingredient_name_id=ingredient,
+                          amount=rng.randint(1, 500))
+        for recipe in recipe_ids
+        for ingredient in rng.sample(ingredient_ids, recipe_ingredients)
+    ))
+
+    insert(Follow, (
+        Follow(user_id=user, author_id=author)
+        for user in user_ids
+        for author in [
+            author for author in rng.sample(user_ids, follows + 1)
+            if author != user
+        ][:follows]
+    ))
+    for model, size in ((ShoppingList, cart_size), (Favorite, favorites)):
+        insert(model, (
+            model(user_id=user, recipe_id=recipe,
+                  created=now - timedelta(minutes=rng.randint(0, 10080)))
+            for user in user_ids
+            for recipe in rng.sample(recipe_ids, size)
+        ))
+
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), (
+            CustomUser, Tag, Ingredient, Recipe, RecipeTags,
+            IngredientsAmount, Follow, ShoppingList, Favorite,
+        )):
+            cursor.execute(sql)
+    if connection.vendor == 'postgresql':
+        Recipe.objects.update(search_vector=RECIPE_SEARCH_VECTOR)
+    ShoppingListIngredient.objects.rebuild()
+    reconcile_counters()
+    FeedItem.objects.rebuild()
+    bump_version(PANTRY_VERSION)
+    bump_version(INGREDIENTS_VERSION)
+    return CustomUser.objects.get(pk=user_ids[0])
+
+
+class QueryCounter:
+    """Обертка connection.execute_wrapper, считающая запросы."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def wrap(self):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+
+def _request(client, path, params):
+    response = client.get(path, params)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def measure(client, path, params, repeat, warmup):
+    """
+    Замеры одного сценария.
+
+    Время и число запросов берутся из repeat повторов после warmup
+    прогревочных, пиковая память - из отдельного повтора под tracemalloc,
+    чтобы трассировка не искажала время.
+    """
+    for _ in range(warmup):
+        _request(client, path, params)
+    latencies = []
+    queries = 0
+    for _ in range(repeat):
+        counter = QueryCounter()
+        with counter.wrap():
+            started = perf_counter()
+            response = _request(client, path, params)
+            latencies.append(perf_counter() - started)
+        queries = max(queries, counter.count)
+    tracemalloc.start()
+    try:
+        _request(client, path, params)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    p50, p95, p99 = np.percentile(latencies, (50, 95, 99)) * 1000
+    return {
+        'status': response.status_code,
+        'p50_ms': round(p50, 3),
+        'p95_ms': round(p95, 3),
+        'p99_ms': round(p99, 3),
+        'mean_ms': round(float(np.mean(latencies)) * 1000, 3),
+        'queries': queries,
+        'peak_memory_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(scenarios, baseline):
+    """Изменение метрик относительно прошлого результата, в процентах."""
+    diff = {}
+    for name, metrics in scenarios.items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        diff[name] = {}
+        for metric in COMPARED_METRICS:
+            if metric not in previous:
+                continue
+            before, after = previous[metric], metrics[metric]
+            diff[name][metric] = {
+                'baseline': before,
+                'change_pct': (
+                    round((after - before) / before * 100, 1)
+                    if before else None
+                ),
+            }
+    return diff
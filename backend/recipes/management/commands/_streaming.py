@@ -0,0 +1,69 @@
+import json
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(file, chunk_size=READ_CHUNK_SIZE):
+    """
+    Итерирует элементы JSON-массива верхнего уровня, читая файл частями.
+
+    В памяти одновременно находится только текущий фрагмент файла
+    и разбираемый элемент.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+
+    while True:
+        # Пропускаем пробелы и разделители между элементами.
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+
+        if position >= len(buffer):
+            raise ValueError('Неожиданный конец JSON-файла.')
+        if not started:
+            if buffer[position] != '[':
+                raise ValueError('Ожидается JSON-массив.')
+            started = True
+            position += 1
+            continue
+        if buffer[position] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        # Число в конце буфера может быть обрезано: дочитываем файл.
+        if end == len(buffer) and not eof:
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield item
+        position = end
+
+
+def batched(iterable, size):
+    """Разбивает поток на списки длиной не более size."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
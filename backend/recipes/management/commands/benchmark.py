@@ -0,0 +1,180 @@
+import json
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+from rest_framework.test import APIClient
+
+from recipes.management.commands._benchmark import (SCENARIOS, compare,
+                                                    measure, seed)
+
+# Параметры набора данных: (значение по умолчанию, описание).
+SCALE = {
+    'users': (200, 'Количество пользователей.'),
+    'follows': (20, 'Количество подписок каждого пользователя.'),
+    'recipes': (2000, 'Количество рецептов.'),
+    'ingredients': (2000, 'Количество ингредиентов в справочнике.'),
+    'recipe_ingredients': (8, 'Количество ингредиентов в рецепте.'),
+    'cart_size': (10, 'Количество рецептов в корзине пользователя.'),
+    'favorites': (20, 'Количество рецептов в избранном пользователя.'),
+    'tags': (10, 'Количество тегов.'),
+}
+# Отдельный кэш: замеры не читают и не портят кэш приложения.
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа, число SQL-запросов и пиковую память '
+        'основных эндпоинтов на синтетических данных. Данные создаются '
+        'в отдельной тестовой базе (SQLite или PostgreSQL из настроек), '
+        'которая удаляется после замеров. Результат - JSON.'
+    )
+
+    def add_arguments(self, parser):
+        for name, (default, help_text) in SCALE.items():
+            parser.add_argument(
+                f'--{name.replace("_", "-")}',
+                type=int,
+                default=default,
+                help=help_text,
+            )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Количество замеряемых запросов на сценарий.',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Количество прогревочных запросов на сценарий.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Начальное значение генератора случайных данных.',
+        )
+        parser.add_argument(
+            '--scenario',
+            choices=tuple(SCENARIOS),
+            action='append',
+            dest='scenarios',
+            help='Сценарий (можно указать несколько раз, по умолчанию все).',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для результата (по умолчанию stdout).',
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Прошлый результат для сравнения.',
+        )
+        parser.add_argument(
+            '--max-regression',
+            type=float,
+            help=(
+                'Допустимый рост p95 в процентах относительно --baseline; '
+                'при большем росте или росте числа запросов '
+                'команда завершается ошибкой.'
+            ),
+        )
+
+    def run(self, scale, options):
+        started = perf_counter()
+        viewer = seed(random_seed=options['seed'], **scale)
+        seed_seconds = perf_counter() - started
+        anonymous, authenticated = APIClient(), APIClient()
+        authenticated.force_authenticate(viewer)
+        scenarios = {}
+        for name in options['scenarios'] or SCENARIOS:
+            path, params, as_user = SCENARIOS[name]
+            scenarios[name] = measure(
+                authenticated if as_user else anonymous,
+                path,
+                params,
+                options['repeat'],
+                options['warmup'],
+            )
+            if scenarios[name]['status'] != 200:
+                raise CommandError(
+                    f'{name}: ответ {scenarios[name]["status"]}.'
+                )
+        return {
+            'database': connection.vendor,
+            'scale': scale,
+            'repeat': options['repeat'],
+            'warmup': options['warmup'],
+            'seed_seconds': round(seed_seconds, 3),
+            'scenarios': scenarios,
+        }
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть не меньше 1.')
+        if options['users'] < 1:
+            raise CommandError('--users должен быть не меньше 1.')
+        if options['max_regression'] is not None and not options['baseline']:
+            raise CommandError('--max-regression требует --baseline.')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as error:
+                raise CommandError(
+                    f'Ошибка чтения {options["baseline"]}: {error}'
+                )
+        scale = {name: options[name] for name in SCALE}
+
+        with override_settings(CACHES=BENCHMARK_CACHES):
+            setup_test_environment()
+            old_config = setup_databases(
+                verbosity=0, interactive=False, aliases={DEFAULT_DB_ALIAS}
+            )
+            try:
+                result = self.run(scale, options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+
+        if baseline is not None:
+            result['diff'] = compare(result['scenarios'], baseline)
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['max_regression'] is not None:
+            missing = set(result['scenarios']) - set(result['diff'])
+            if missing:
+                self.stderr.write(
+                    'Нет в --baseline, не сравниваются: '
+                    f'{", ".join(sorted(missing))}.'
+                )
+            regressions = [
+                name
+                for name, metrics in result['diff'].items()
+                if (metrics.get('p95_ms', {}).get('change_pct') or 0)
+                > options['max_regression']
+                or result['scenarios'][name]['queries']
+                > metrics.get('queries', {}).get(
+                    'baseline', float('inf')
+                )
+            ]
+            if regressions:
+                raise CommandError(
+                    f'Регрессия в сценариях: {", ".join(regressions)}.'
+                )
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие рецепты по общим ингредиентам и тегам '
+        '(косинусное сходство TF-IDF).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=settings.SIMILAR_RECIPES_TOP_K,
+            help='Количество соседей для каждого рецепта.',
+        )
+        parser.add_argument(
+            '--block-size',
+            type=int,
+            default=200,
+            help='Количество строк матрицы в одном блоке умножения.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        created = rebuild(k=options['top_k'], block_size=options['block_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Сохранено пар похожих рецептов: {created}, '
+            f'{time.monotonic() - started:.2f} с.'
+        ))
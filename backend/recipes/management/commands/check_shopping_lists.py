@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListIngredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет агрегированные списки покупок с корзинами пользователей. '
+        'Расхождения исправляются командой rebuild_shopping_lists.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='id пользователя (можно указать несколько раз).',
+        )
+
+    def handle(self, *args, **options):
+        users = options['users']
+        stored = ShoppingListIngredient.objects.all()
+        if users is not None:
+            stored = stored.filter(user__in=users)
+        stored = {
+            (user, ingredient): amount
+            for user, ingredient, amount in stored.values_list(
+                'user', 'ingredient', 'amount'
+            ).iterator()
+        }
+        mismatches = 0
+        for user, ingredient, total in (
+            ShoppingListIngredient.objects.expected(users).iterator()
+        ):
+            amount = stored.pop((user, ingredient), None)
+            if amount != total:
+                mismatches += 1
+                self.stdout.write(
+                    f'user={user} ingredient={ingredient}: '
+                    f'сохранено {amount}, ожидается {total}'
+                )
+        for (user, ingredient), amount in stored.items():
+            mismatches += 1
+            self.stdout.write(
+                f'user={user} ingredient={ingredient}: '
+                f'сохранено {amount}, ожидается None'
+            )
+
+        if mismatches:
+            raise CommandError(f'Найдено расхождений: {mismatches}.')
+        self.stdout.write(self.style.SUCCESS('Расхождений не найдено.'))
@@ -0,0 +1,206 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import (DEFAULT_DB_ALIAS, IntegrityError, connection,
+                       transaction)
+from django.db.models import AutoField
+from django.utils import timezone
+
+from api.cache import RECIPE_FRAGMENTS_VERSION, bump_version
+from api.pantry import PANTRY_VERSION
+from api.search import INGREDIENTS_VERSION
+from api.snapshots import TAGS_VERSION
+from recipes.counters import reconcile_counters
+from recipes.management.commands._streaming import iter_json_array
+from recipes.models import (RECIPE_SEARCH_VECTOR,
+                            Favorite,
+                            FeedItem,
+                            Ingredient,
+                            IngredientsAmount,
+                            Recipe,
+                            ShoppingList,
+                            ShoppingListIngredient,
+                            Tag)
+from users.models import CustomUser, Follow
+
+RecipeTags = Recipe.tags.through
+# Версии кэшей и модели, от которых они зависят.
+VERSIONS = (
+    (INGREDIENTS_VERSION, {Ingredient}),
+    (TAGS_VERSION, {Tag}),
+    (PANTRY_VERSION, {Recipe, IngredientsAmount}),
+    (
+        RECIPE_FRAGMENTS_VERSION,
+        {Recipe, RecipeTags, IngredientsAmount, Ingredient, Tag, CustomUser},
+    ),
+)
+
+
+def dependency_order(models):
+    """Сортирует модели так, чтобы связанные модели шли раньше зависимых."""
+    ordered = []
+    visiting = set()
+
+    def visit(model):
+        if model in ordered or model in visiting:
+            return
+        visiting.add(model)
+        for field in model._meta.concrete_fields:
+            if field.related_model in models:
+                visit(field.related_model)
+        ordered.append(model)
+
+    for model in models:
+        visit(model)
+    return ordered
+
+
+class Command(BaseCommand):
+    help = (
+        'Быстро загружает JSON-фикстуру в формате dumpdata: файл читается '
+        'потоково, объекты вставляются пачками без вызова save() и сигналов. '
+        'Предназначена для начального заполнения пустой базы: в отличие '
+        'от loaddata, объект с уже занятым первичным ключом не обновляется, '
+        'а прерывает загрузку.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fixtures', nargs='+', help='Пути к фикстурам.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество объектов одной модели в одной пачке.',
+        )
+
+    def insert(self, model, objects):
+        with_pk = [obj for obj in objects if obj.pk is not None]
+        without_pk = [obj for obj in objects if obj.pk is None]
+        fields = model._meta.concrete_fields
+        self.insert_batches(model, with_pk, fields)
+        # Как в bulk_create: без первичного ключа id назначает база,
+        # на PostgreSQL явный NULL нарушает NOT NULL.
+        self.insert_batches(model, without_pk, [
+            field for field in fields if not isinstance(field, AutoField)
+        ])
+        self.counts[model] = self.counts.get(model, 0) + len(objects)
+
+    def insert_batches(self, model, objects, fields):
+        if not objects:
+            return
+        batch_size = max(
+            connection.ops.bulk_batch_size(fields, objects), 1
+        )
+        for start in range(0, len(objects), batch_size):
+            # raw=True, как в loaddata: значения auto_now_add
+            # и другие pre_save берутся из фикстуры.
+            model._base_manager._insert(
+                objects[start:start + batch_size],
+                fields=fields,
+                using=DEFAULT_DB_ALIAS,
+                raw=True,
+            )
+
+    def flush(self, model):
+        objects = self.buffers.pop(model, None)
+        if objects:
+            self.insert(model, objects)
+
+    def add(self, model, obj):
+        # Фикстуры, снятые до появления полей с auto_now_add и auto_now,
+        # получают текущее время, как при создании объекта.
+        for field in model._meta.concrete_fields:
+            if (
+                (
+                    getattr(field, 'auto_now_add', False)
+                    or getattr(field, 'auto_now', False)
+                )
+                and getattr(obj, field.attname) is None
+            ):
+                setattr(obj, field.attname, self.now)
+        buffer = self.buffers.setdefault(model, [])
+        buffer.append(obj)
+        if len(buffer) >= self.batch_size:
+            self.flush(model)
+
+    def load(self, path):
+        with open(path, encoding='utf-8') as file:
+            for item in iter_json_array(file):
+                for deserialized in Deserializer([item]):
+                    obj = deserialized.object
+                    model = type(obj)
+                    self.add(model, obj)
+                    for name, values in (deserialized.m2m_data or {}).items():
+                        field = model._meta.get_field(name)
+                        through = field.remote_field.through
+                        source = field.m2m_field_name()
+                        target = field.m2m_reverse_field_name()
+                        for value in values:
+                            self.add(through, through(**{
+                                f'{source}_id': obj.pk,
+                                f'{target}_id': value,
+                            }))
+
+    def after_load(self):
+        """Обновляет данные, которые обычно поддерживаются save()."""
+        if Recipe in self.counts and connection.vendor == 'postgresql':
+            Recipe.objects.filter(search_vector__isnull=True).update(
+                search_vector=RECIPE_SEARCH_VECTOR
+            )
+        if ShoppingList in self.counts or IngredientsAmount in self.counts:
+            ShoppingListIngredient.objects.rebuild()
+        if self.counts.keys() & {Recipe, Favorite, ShoppingList}:
+            reconcile_counters()
+        if self.counts.keys() & {Recipe, Follow}:
+            FeedItem.objects.rebuild()
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.buffers = {}
+        self.counts = {}
+        self.now = timezone.now()
+        started = time.monotonic()
+
+        with transaction.atomic():
+            with connection.constraint_checks_disabled():
+                for path in options['fixtures']:
+                    try:
+                        self.load(path)
+                    except (OSError, ValueError) as error:
+                        raise CommandError(
+                            f'Ошибка загрузки {path}: {error}'
+                        )
+                try:
+                    for model in dependency_order(list(self.buffers)):
+                        self.flush(model)
+                except IntegrityError as error:
+                    raise CommandError(
+                        f'Ошибка вставки {model._meta.label}: {error}. '
+                        'Команда заполняет пустую базу, для обновления '
+                        'существующих объектов используйте loaddata.'
+                    )
+            connection.check_constraints(
+                table_names=[model._meta.db_table for model in self.counts]
+            )
+            sequence_sql = connection.ops.sequence_reset_sql(
+                no_style(), list(self.counts)
+            )
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+            self.after_load()
+
+        for version, models in VERSIONS:
+            if self.counts.keys() & models:
+                bump_version(version)
+
+        elapsed = time.monotonic() - started
+        total = sum(self.counts.values())
+        for model in dependency_order(list(self.counts)):
+            self.stdout.write(f'{model._meta.label}: {self.counts[model]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено объектов: {total}, {elapsed:.2f} с '
+            f'({total / max(elapsed, 1e-6):.0f} объектов/с).'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создает уменьшенные копии изображений рецептов, где их нет.'
+
+    def handle(self, *args, **options):
+        processed = 0
+        for recipe_id in (
+            Recipe.objects.exclude(image='')
+            .values_list('pk', flat=True)
+            .iterator()
+        ):
+            process_recipe_image(recipe_id)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено рецептов: {processed}.'
+        ))
@@ -0,0 +1,114 @@
+import csv
+import io
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import bump_version
+from api.search import INGREDIENTS_VERSION
+from recipes.management.commands._streaming import batched, iter_json_array
+from recipes.models import Ingredient
+
+DEFAULT_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV или JSON файла. '
+        'Уже существующие ингредиенты пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=str(DEFAULT_PATH),
+            help='Путь к файлу .csv или .json.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество строк в одной пачке.',
+        )
+
+    def read_rows(self, path):
+        with open(path, encoding='utf-8', newline='') as file:
+            if path.suffix == '.json':
+                for item in iter_json_array(file):
+                    yield item['name'], item['measurement_unit']
+            else:
+                for row in csv.reader(file):
+                    if row:
+                        yield row[0], row[1]
+
+    def import_postgresql(self, rows, batch_size):
+        """COPY во временную таблицу и вставка новых строк одним запросом."""
+        table = Ingredient._meta.db_table
+        read = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import '
+                '(name varchar(300), measurement_unit varchar(50)) '
+                'ON COMMIT DROP'
+            )
+            for batch in batched(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_import FROM STDIN WITH (FORMAT csv)',
+                    buffer,
+                )
+                read += len(batch)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_import '
+                'ON CONFLICT ON CONSTRAINT unique_name_measurement_unit '
+                'DO NOTHING'
+            )
+            created = cursor.rowcount
+        return read, created
+
+    def import_default(self, rows, batch_size):
+        read = 0
+        before = Ingredient.objects.count()
+        for batch in batched(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ),
+                ignore_conflicts=True,
+            )
+            read += len(batch)
+        return read, Ingredient.objects.count() - before
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден.')
+
+        started = time.monotonic()
+        rows = self.read_rows(path)
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                read, created = self.import_postgresql(
+                    rows, options['batch_size']
+                )
+            else:
+                read, created = self.import_default(
+                    rows, options['batch_size']
+                )
+        elapsed = time.monotonic() - started
+        if created:
+            bump_version(INGREDIENTS_VERSION)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {read}, добавлено: {created}, '
+            f'{elapsed:.2f} с ({read / max(elapsed, 1e-6):.0f} строк/с).'
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import ShoppingListIngredient
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает агрегированные списки покупок пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='id пользователя (можно указать несколько раз).',
+        )
+
+    def handle(self, *args, **options):
+        ShoppingListIngredient.objects.rebuild(options['users'])
+        self.stdout.write(self.style.SUCCESS(
+            'Списки покупок пересчитаны.'
+        ))
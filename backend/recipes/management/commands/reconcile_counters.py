@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счетчики избранного, корзин и рецептов автора '
+        'с фактическим числом строк и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя.',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        result = reconcile_counters(dry_run=dry_run)
+        for counter, drifted in result.items():
+            self.stdout.write(f'{counter}: расхождений {drifted}')
+        total = sum(result.values())
+        if dry_run and total:
+            raise CommandError(f'Найдено расхождений: {total}.')
+        if total:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено счетчиков: {total}.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено.'))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.trending import update_trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает популярность рецептов по добавлениям в избранное '
+        'и список покупок с момента прошлого запуска. '
+        'Предназначена для периодического запуска (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Пересчитать очки заново по всем событиям.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        updated = update_trending(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рецептов: {updated}, '
+            f'{time.monotonic() - started:.2f} с.'
+        ))
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:49
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    ShoppingList = apps.get_model('recipes', 'ShoppingList')
+    CustomUser = apps.get_model('users', 'CustomUser')
+
+    def count(model, field):
+        return Coalesce(
+            models.Subquery(
+                model.objects
+                .filter(**{field: models.OuterRef('pk')})
+                .order_by()
+                .values(field)
+                .annotate(count=models.Count('pk'))
+                .values('count')
+            ),
+            0,
+        )
+
+    Recipe.objects.update(
+        favorites_count=count(Favorite, 'recipe'),
+        in_carts_count=count(ShoppingList, 'recipe'),
+    )
+    CustomUser.objects.update(recipes_count=count(Recipe, 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_customuser_recipes_count'),
+        ('recipes', '0007_recipe_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число добавлений в список покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
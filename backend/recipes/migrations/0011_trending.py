@@ -0,0 +1,63 @@
+# Generated by Django 3.2.3 on 2026-10-18 06:01
+
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Существующие добавления получают давнюю дату: иначе первый пересчет
+# популярности принял бы всю историю за свежие события.
+CREATED_BEFORE_TRENDING = datetime.datetime(
+    1970, 1, 1, tzinfo=datetime.timezone.utc
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeTrend',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(default=0, verbose_name='Популярность')),
+            ],
+            options={
+                'verbose_name': 'Популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('computed_at', models.DateTimeField(verbose_name='Время пересчета')),
+                ('last_favorite_id', models.BigIntegerField(default=0, verbose_name='Последнее учтенное добавление в избранное')),
+                ('last_shopping_list_id', models.BigIntegerField(default=0, verbose_name='Последнее учтенное добавление в список покупок')),
+            ],
+            options={
+                'verbose_name': 'Пересчет популярности',
+                'verbose_name_plural': 'Пересчеты популярности',
+                'ordering': ('-computed_at',),
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=CREATED_BEFORE_TRENDING, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=CREATED_BEFORE_TRENDING, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='recipetrend',
+            index=models.Index(fields=['-score'], name='recipe_trend_score_idx'),
+        ),
+    ]
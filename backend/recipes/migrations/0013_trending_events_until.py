@@ -0,0 +1,34 @@
+# Generated by Django 3.2.3 on 2026-10-18 06:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='trendingrun',
+            name='last_favorite_id',
+        ),
+        migrations.RemoveField(
+            model_name='trendingrun',
+            name='last_shopping_list_id',
+        ),
+        migrations.AddField(
+            model_name='trendingrun',
+            name='events_until',
+            field=models.DateTimeField(null=True, verbose_name='Учтены события до'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['created'], name='favorite_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppinglist',
+            index=models.Index(fields=['created'], name='shopping_list_created_idx'),
+        ),
+    ]
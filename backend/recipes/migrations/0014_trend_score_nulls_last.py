@@ -0,0 +1,40 @@
+# Generated by Django 3.2.3 on 2026-10-18 06:42
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+class PostgresAddIndex(migrations.AddIndex):
+    """NULLS LAST в индексе поддерживает только PostgreSQL."""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_trending_events_until'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipetrend',
+            name='recipe_trend_score_idx',
+        ),
+        PostgresAddIndex(
+            model_name='recipetrend',
+            index=models.Index(django.db.models.expressions.OrderBy(django.db.models.expressions.F('score'), descending=True, nulls_last=True), name='recipe_trend_score_idx'),
+        ),
+    ]
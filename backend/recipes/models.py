@@ -1,11 +1,24 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connection, models, transaction
+from django.db.models import F, Sum, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from django.core.validators import MinValueValidator, MaxValueValidator
 
-from users.models import CustomUser
+from users.models import CustomUser, Follow
 from foodgram.settings import (MIN_COOK_TIME,
                                MAX_COOK_TIME,
                                MAX_INGR_AMOUNT,
-                               MIN_INGR_AMOUNT)
+                               MIN_INGR_AMOUNT,
+                               SEARCH_CONFIG,
+                               FEED_BACKFILL_LIMIT)
+
+RECIPE_SEARCH_VECTOR = (
+    SearchVector('name', weight='A', config=SEARCH_CONFIG)
+    + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+)
+SEARCH_VECTOR_FIELDS = {'name', 'text'}
 
 
 class Tag(models.Model):
@@ -59,6 +72,33 @@ class Ingredient(models.Model):
         return f"{self.name} {self.measurement_unit}"
 
 
+class RecipeManager(models.Manager):
+    def latest_by_author(self, author_ids, limit):
+        """
+        Последние limit рецептов каждого из авторов author_ids.
+
+        Рецепты нумеруются внутри автора оконной функцией ROW_NUMBER()
+        за один проход по рецептам этих авторов, без подзапроса
+        на каждый рецепт или автора.
+        """
+        ranked = (
+            self.filter(author__in=author_ids)
+            .annotate(row_number=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('pk').desc()),
+            ))
+            .order_by()
+            .values('pk', 'row_number')
+        )
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT "ranked"."id" FROM ({sql}) "ranked" '
+            'WHERE "ranked"."row_number" <= %s',
+            (*params, limit),
+        )).order_by('-pub_date', '-pk')
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         CustomUser,
@@ -109,6 +149,32 @@ class Recipe(models.Model):
         auto_now_add=True,
         editable=False,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Число добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='Число добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии фото',
+        default=dict,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeManager()
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -120,22 +186,53 @@ class Recipe(models.Model):
                 name='unique_name_author'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            GinIndex(
+                fields=('search_vector',),
+                name='recipe_search_vector_idx',
+            ),
+            GinIndex(
+                fields=('name',),
+                name='recipe_name_trgm_idx',
+                opclasses=('gin_trgm_ops',),
+            ),
+        )
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # updated_at входит в ключ кэша представления рецепта.
+            kwargs['update_fields'] = {*update_fields, 'updated_at'}
+        super().save(*args, **kwargs)
+        if update_fields is not None and not (
+            set(update_fields) & SEARCH_VECTOR_FIELDS
+        ):
+            return
+        # Поисковый вектор поддерживается только в PostgreSQL.
+        if connection.vendor == 'postgresql':
+            Recipe.objects.filter(pk=self.pk).update(
+                search_vector=RECIPE_SEARCH_VECTOR
+            )
+
 
 class IngredientsAmount(models.Model):
     recipe = models.ForeignKey(
         Recipe,
         verbose_name='Рецепт',
-        related_name='ingredients',
+        related_name='ingredients_amounts',
         on_delete=models.CASCADE,
     )
     ingredient_name = models.ForeignKey(
         Ingredient,
         verbose_name='Ингредиент',
-        related_name='recipes',
+        related_name='recipe',
         on_delete=models.CASCADE,
     )
     amount = models.PositiveSmallIntegerField(
@@ -180,10 +277,17 @@ class Favorite(models.Model):
         related_name='in_favorites',
         on_delete=models.CASCADE
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+    )
 
     class Meta:
         verbose_name = 'Список избранного'
         verbose_name_plural = 'Списки избранного'
+        indexes = (
+            models.Index(fields=('created',), name='favorite_created_idx'),
+        )
         constraints = (
             models.UniqueConstraint(
                 fields=('recipe', 'user'),
@@ -208,10 +312,18 @@ class ShoppingList(models.Model):
         related_name='in_shopping_list',
         on_delete=models.CASCADE,
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        auto_now_add=True,
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+        indexes = (
+            models.Index(fields=('created',),
+                         name='shopping_list_created_idx'),
+        )
         constraints = (
             models.UniqueConstraint(
                 fields=('recipe', 'user'),
@@ -221,3 +333,374 @@ class ShoppingList(models.Model):
 
     def __str__(self):
         return f'{self.user}. {self.recipe}'
+
+
+class ShoppingListIngredientManager(models.Manager):
+    """Инкрементальное обновление агрегированного списка покупок."""
+
+    @staticmethod
+    def totals(recipes):
+        """Суммарное количество ингредиентов в рецептах."""
+        return dict(
+            IngredientsAmount.objects
+            .filter(recipe__in=recipes)
+            .values_list('ingredient_name')
+            .annotate(total=Sum('amount'))
+        )
+
+    def expected(self, users=None):
+        """Строки агрегата, посчитанные заново по корзинам пользователей."""
+        queryset = IngredientsAmount.objects.filter(
+            recipe__in_shopping_list__isnull=False
+        )
+        if users is not None:
+            queryset = queryset.filter(
+                recipe__in_shopping_list__user__in=users
+            )
+        return (
+            queryset
+            .values_list('recipe__in_shopping_list__user', 'ingredient_name')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+
+    def _upsert(self, users, ingredients, delta):
+        """
+        Прибавляет delta к строкам users x ingredients одним запросом.
+
+        INSERT ... ON CONFLICT DO UPDATE не проверяет существование строк
+        заранее, поэтому параллельные добавления одного ингредиента
+        складываются, а не нарушают уникальность.
+        """
+        quote = connection.ops.quote_name
+        opts = self.model._meta
+        table = quote(opts.db_table)
+        user_field = opts.get_field('user')
+        ingredient_field = opts.get_field('ingredient')
+        amount = quote(opts.get_field('amount').column)
+        user_column = quote(user_field.column)
+        ingredient_column = quote(ingredient_field.column)
+        user_table = quote(user_field.related_model._meta.db_table)
+        user_pk = quote(user_field.related_model._meta.pk.column)
+        ingredient_table = quote(
+            ingredient_field.related_model._meta.db_table
+        )
+        ingredient_pk = quote(ingredient_field.related_model._meta.pk.column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'({user_column}, {ingredient_column}, {amount}) '
+                f'SELECT u.{user_pk}, i.{ingredient_pk}, %s '
+                f'FROM {user_table} u CROSS JOIN {ingredient_table} i '
+                f'WHERE u.{user_pk} IN ({", ".join(["%s"] * len(users))}) '
+                f'AND i.{ingredient_pk} IN '
+                f'({", ".join(["%s"] * len(ingredients))}) '
+                f'ON CONFLICT ({user_column}, {ingredient_column}) '
+                f'DO UPDATE SET {amount} = {table}.{amount} '
+                f'+ EXCLUDED.{amount}',
+                (delta, *users, *ingredients),
+            )
+
+    @transaction.atomic
+    def apply_delta(self, users, deltas, batch_size=500):
+        """
+        Прибавляет deltas ({id ингредиента: изменение}) к агрегатам users.
+
+        Число запросов зависит от числа различных изменений,
+        а не от числа пользователей.
+        """
+        deltas = {
+            ingredient: delta for ingredient, delta in deltas.items() if delta
+        }
+        if not deltas:
+            return
+        users = list(users)
+        if not users:
+            return
+        by_delta = {}
+        for ingredient, delta in deltas.items():
+            by_delta.setdefault(delta, []).append(ingredient)
+        for delta, ingredients in by_delta.items():
+            for start in range(0, len(users), batch_size):
+                self._upsert(
+                    users[start:start + batch_size], ingredients, delta
+                )
+        self.filter(
+            user__in=users, ingredient__in=deltas, amount__lte=0
+        ).delete()
+
+    def add_recipes(self, user, *recipes):
+        self.apply_delta((user.pk,), self.totals(recipes))
+
+    def remove_recipes(self, user, *recipes):
+        self.apply_delta(
+            (user.pk,),
+            {
+                ingredient: -total
+                for ingredient, total in self.totals(recipes).items()
+            }
+        )
+
+    def recipe_changed(self, recipe, old_totals):
+        """Переносит изменение состава рецепта в корзины с этим рецептом."""
+        new_totals = self.totals((recipe,))
+        deltas = {
+            ingredient: (
+                new_totals.get(ingredient, 0) - old_totals.get(ingredient, 0)
+            )
+            for ingredient in new_totals.keys() | old_totals.keys()
+        }
+        self.apply_delta(
+            recipe.in_shopping_list.values_list('user', flat=True), deltas
+        )
+
+    def recipe_deleted(self, recipe):
+        """Вычитает удаляемый рецепт из всех корзин."""
+        self.apply_delta(
+            recipe.in_shopping_list.values_list('user', flat=True),
+            {
+                ingredient: -total
+                for ingredient, total in self.totals((recipe,)).items()
+            }
+        )
+
+    @transaction.atomic
+    def rebuild(self, users=None, batch_size=1000):
+        """Пересчитывает агрегат с нуля."""
+        queryset = self.all()
+        if users is not None:
+            queryset = queryset.filter(user__in=users)
+        queryset.delete()
+        batch = []
+        for user, ingredient, total in self.expected(users).iterator():
+            batch.append(self.model(
+                user_id=user, ingredient_id=ingredient, amount=total
+            ))
+            if len(batch) >= batch_size:
+                self.bulk_create(batch)
+                batch = []
+        self.bulk_create(batch)
+
+
+class ShoppingListIngredient(models.Model):
+    user = models.ForeignKey(
+        CustomUser,
+        verbose_name='Пользователь',
+        related_name='shopping_list_ingredients',
+        on_delete=models.CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        related_name='in_shopping_lists',
+        on_delete=models.CASCADE,
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество',
+        default=0,
+    )
+
+    objects = ShoppingListIngredientManager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_ingredient_user',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}. {self.amount} {self.ingredient}'
+
+
+class FeedItemManager(models.Manager):
+    """Ленты рецептов авторов, на которых подписан пользователь."""
+
+    def _create(self, items, batch_size=1000):
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                self.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        self.bulk_create(batch, ignore_conflicts=True)
+
+    def fan_out(self, recipe):
+        """Добавляет новый рецепт в ленты всех подписчиков автора."""
+        if recipe.author_id is None:
+            return
+        followers = Follow.objects.filter(
+            author_id=recipe.author_id
+        ).values_list('user', flat=True)
+        self._create(
+            self.model(
+                user_id=user,
+                recipe_id=recipe.pk,
+                author_id=recipe.author_id,
+                pub_date=recipe.pub_date,
+            )
+            for user in followers.iterator()
+        )
+
+    def backfill(self, user_id, author_id):
+        """Добавляет в ленту последние рецепты нового автора."""
+        recipes = Recipe.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-pk'
+        ).values_list('pk', 'pub_date')[:FEED_BACKFILL_LIMIT]
+        self._create(
+            self.model(
+                user_id=user_id,
+                recipe_id=recipe,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for recipe, pub_date in recipes
+        )
+
+    def prune(self, user_id, author_id):
+        """Убирает из ленты рецепты автора после отписки."""
+        self.filter(user_id=user_id, author_id=author_id).delete()
+
+    @transaction.atomic
+    def rebuild(self):
+        """Пересчитывает все ленты с нуля."""
+        self.all().delete()
+        for user, author in Follow.objects.values_list(
+            'user', 'author'
+        ).iterator():
+            self.backfill(user, author)
+
+
+class FeedItem(models.Model):
+    user = models.ForeignKey(
+        CustomUser,
+        verbose_name='Подписчик',
+        related_name='feed',
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='in_feeds',
+        on_delete=models.CASCADE,
+    )
+    author = models.ForeignKey(
+        CustomUser,
+        verbose_name='Автор',
+        related_name='in_feeds',
+        on_delete=models.CASCADE,
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    objects = FeedItemManager()
+
+    class Meta:
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Рецепты в лентах'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_item_user_recipe',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-id'),
+                name='feed_item_user_pub_date_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='similar_recipes',
+        on_delete=models.CASCADE,
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        verbose_name='Похожий рецепт',
+        related_name='+',
+        on_delete=models.CASCADE,
+    )
+    score = models.FloatField(
+        verbose_name='Сходство',
+    )
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}: {self.score:.3f}'
+
+
+class RecipeTrend(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='trend',
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    score = models.FloatField(
+        verbose_name='Популярность',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        indexes = (
+            # Порядок как в сортировке ?ordering=trending: у рецептов
+            # без строки RecipeTrend очков нет (NULL), они идут последними.
+            # Создается только в PostgreSQL (миграция 0014).
+            models.Index(
+                models.F('score').desc(nulls_last=True),
+                name='recipe_trend_score_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe}: {self.score:.3f}'
+
+
+class TrendingRun(models.Model):
+    """Момент последнего пересчета популярности и граница учтенных событий."""
+
+    computed_at = models.DateTimeField(
+        verbose_name='Время пересчета',
+    )
+    events_until = models.DateTimeField(
+        verbose_name='Учтены события до',
+        null=True,
+    )
+
+    class Meta:
+        verbose_name = 'Пересчет популярности'
+        verbose_name_plural = 'Пересчеты популярности'
+        ordering = ('-computed_at',)
+
+    def __str__(self):
+        return f'{self.computed_at:%Y-%m-%d %H:%M:%S}'
@@ -0,0 +1,79 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.counters import change_counter, is_counted
+from recipes.models import FeedItem, Favorite, Recipe, ShoppingList
+from recipes.transactions import is_deleted, mark_deleted
+from users.models import CustomUser, Follow
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingList)
+def increment_recipe_counter(sender, instance, created, raw, **kwargs):
+    # Фикстуры содержат уже посчитанные значения счетчиков.
+    if created and not raw:
+        change_counter(sender, (instance.recipe_id,), 1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_deleted_recipe(instance, **kwargs):
+    mark_deleted(instance)
+
+
+@receiver(pre_delete, sender=CustomUser)
+def decrement_user_rows(instance, **kwargs):
+    # Строки пользователя удаляются каскадом: счетчики их рецептов
+    # уменьшаются здесь одним UPDATE на модель, а не на каждую строку.
+    mark_deleted(instance)
+    for model in (Favorite, ShoppingList):
+        change_counter(
+            model,
+            list(
+                model.objects.filter(user=instance)
+                .values_list('recipe', flat=True)
+            ),
+            -1,
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingList)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    # Счетчик удаляемого рецепта не нужен, строки удаляемого
+    # пользователя учтены в decrement_user_rows(), отмеченные
+    # mark_counted() - у вызывающего кода.
+    if (
+        is_deleted(Recipe, instance.recipe_id)
+        or is_deleted(CustomUser, instance.user_id)
+        or is_counted(sender, instance.pk)
+    ):
+        return
+    change_counter(sender, (instance.recipe_id,), -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_author_counter(instance, created, raw, **kwargs):
+    if created and not raw:
+        change_counter(Recipe, (instance.author_id,), 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_author_counter(instance, **kwargs):
+    change_counter(Recipe, (instance.author_id,), -1)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, raw, **kwargs):
+    if created and not raw:
+        FeedItem.objects.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(instance, created, raw, **kwargs):
+    if created and not raw:
+        FeedItem.objects.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(instance, **kwargs):
+    FeedItem.objects.prune(instance.user_id, instance.author_id)
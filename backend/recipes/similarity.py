@@ -0,0 +1,261 @@
+"""
+Похожие рецепты по общим ингредиентам и тегам.
+
+Рецепт представлен разреженным вектором признаков (ингредиенты и теги)
+с весами TF-IDF, сходство - косинус между векторами. Для каждого рецепта
+заранее сохраняются SIMILAR_RECIPES_TOP_K ближайших соседей, запросы
+к API читают только готовую таблицу SimilarRecipe.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from scipy import sparse
+
+from recipes.models import IngredientsAmount, Recipe, SimilarRecipe
+
+logger = logging.getLogger(__name__)
+
+Tags = Recipe.tags.through
+
+_executor = None
+_lock = threading.Lock()
+_pending = set()
+
+
+def _pairs(queryset, *fields):
+    return np.fromiter(
+        (value for row in queryset.values_list(*fields).iterator()
+         for value in row),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+
+
+def load_features(recipe_ids=None):
+    """
+    Признаки рецептов.
+
+    Возвращает (id рецептов, коды признаков, бинарная матрица
+    рецепт x признак). Код признака - 2 * id ингредиента
+    или 2 * id тега + 1.
+    """
+    ingredients = IngredientsAmount.objects.all()
+    tags = Tags.objects.all()
+    if recipe_ids is not None:
+        ingredients = ingredients.filter(recipe__in=recipe_ids)
+        tags = tags.filter(recipe__in=recipe_ids)
+    ingredients = _pairs(ingredients, 'recipe_id', 'ingredient_name_id')
+    tags = _pairs(tags, 'recipe_id', 'tag_id')
+    recipes = np.concatenate((ingredients[:, 0], tags[:, 0]))
+    features = np.concatenate((ingredients[:, 1] * 2, tags[:, 1] * 2 + 1))
+
+    recipe_ids, rows = np.unique(recipes, return_inverse=True)
+    codes, columns = np.unique(features, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, columns)),
+        shape=(len(recipe_ids), len(codes)),
+    )
+    # Повторяющиеся пары (рецепт, признак) считаются один раз.
+    matrix.data[:] = 1
+    return recipe_ids, codes, matrix
+
+
+def document_frequency(codes):
+    """Число рецептов с каждым признаком из codes (по всей базе)."""
+    ingredients = dict(
+        IngredientsAmount.objects
+        .filter(ingredient_name__in=(codes[codes % 2 == 0] // 2).tolist())
+        .values_list('ingredient_name')
+        .annotate(count=Count('recipe', distinct=True))
+        .order_by()
+    )
+    tags = dict(
+        Tags.objects
+        .filter(tag__in=(codes[codes % 2 == 1] // 2).tolist())
+        .values_list('tag')
+        .annotate(count=Count('recipe', distinct=True))
+        .order_by()
+    )
+    return np.array([
+        tags.get(code // 2, 0) if code % 2 else ingredients.get(code // 2, 0)
+        for code in codes.tolist()
+    ])
+
+
+def weigh(matrix, df, total):
+    """TF-IDF с нормировкой строк: скалярное произведение - косинус."""
+    idf = np.log((1 + total) / (1 + df)) + 1
+    weighted = sparse.csr_matrix(matrix.multiply(idf))
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)))
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(weighted.multiply(1 / norms))
+
+
+def top_k(columns, values, k):
+    """k наибольших положительных значений разреженной строки по убыванию."""
+    positive = values > 0
+    columns, values = columns[positive], values[positive]
+    if len(values) > k:
+        best = np.argpartition(-values, k - 1)[:k]
+        columns, values = columns[best], values[best]
+    order = np.argsort(-values, kind='stable')
+    return columns[order], values[order]
+
+
+def _neighbours(recipe_id, similar_ids, scores):
+    return [
+        SimilarRecipe(recipe_id=recipe_id, similar_id=similar, score=score)
+        for similar, score in zip(similar_ids.tolist(), scores.tolist())
+    ]
+
+
+@transaction.atomic
+def rebuild(k=None, block_size=200):
+    """
+    Пересчитывает соседей всех рецептов.
+
+    Произведение матриц считается блоками по block_size строк,
+    чтобы ограничить память.
+    """
+    k = k or settings.SIMILAR_RECIPES_TOP_K
+    recipe_ids, _, matrix = load_features()
+    weighted = weigh(
+        matrix,
+        np.asarray(matrix.sum(axis=0)).ravel(),
+        Recipe.objects.count(),
+    )
+    transposed = weighted.T.tocsr()
+    SimilarRecipe.objects.all().delete()
+    created = 0
+    for start in range(0, len(recipe_ids), block_size):
+        block = sparse.csr_matrix(
+            weighted[start:start + block_size] @ transposed
+        )
+        objects = []
+        for offset in range(block.shape[0]):
+            row = slice(block.indptr[offset], block.indptr[offset + 1])
+            columns = block.indices[row]
+            values = block.data[row]
+            itself = columns != start + offset
+            columns, values = top_k(columns[itself], values[itself], k)
+            objects += _neighbours(
+                recipe_ids[start + offset], recipe_ids[columns], values
+            )
+        SimilarRecipe.objects.bulk_create(objects)
+        created += len(objects)
+    return created
+
+
+@transaction.atomic
+def refresh(recipe_id, k=None):
+    """
+    Обновляет соседей рецепта и списки рецептов, у которых он сосед.
+
+    Пересчитываются только рецепты с общими ингредиентами: тегов мало,
+    и общий тег есть почти у любой пары рецептов. Теги учитываются
+    в сходстве, но не в выборе кандидатов. IDF берется по текущим
+    данным, списки остальных рецептов обновляются при полном пересчете
+    (build_similar_recipes).
+    """
+    k = k or settings.SIMILAR_RECIPES_TOP_K
+    candidates = set(
+        IngredientsAmount.objects.filter(
+            ingredient_name__recipe__recipe=recipe_id
+        ).values_list('recipe', flat=True)
+    )
+    candidates.discard(recipe_id)
+    # Рецепты, у которых он был соседом, но общих признаков больше нет.
+    SimilarRecipe.objects.filter(similar=recipe_id).exclude(
+        recipe__in=candidates
+    ).delete()
+    SimilarRecipe.objects.filter(recipe=recipe_id).delete()
+    if not candidates:
+        return
+
+    recipe_ids, codes, matrix = load_features([recipe_id, *candidates])
+    weighted = weigh(
+        matrix, document_frequency(codes), Recipe.objects.count()
+    )
+    position = int(np.searchsorted(recipe_ids, recipe_id))
+    if position == len(recipe_ids) or recipe_ids[position] != recipe_id:
+        return
+    scores = (weighted @ weighted[position].T).toarray().ravel()
+    scores[position] = 0
+
+    columns, values = top_k(np.arange(len(scores)), scores, k)
+    SimilarRecipe.objects.bulk_create(
+        _neighbours(recipe_id, recipe_ids[columns], values)
+    )
+
+    # Рецепт занимает место в чужих списках, если он ближе их k-го соседа.
+    lists = {}
+    for recipe, similar, score in SimilarRecipe.objects.filter(
+        recipe__in=candidates
+    ).values_list('recipe', 'similar', 'score'):
+        lists.setdefault(recipe, {})[similar] = score
+    changed = []
+    for index, score in enumerate(scores.tolist()):
+        candidate = int(recipe_ids[index])
+        if candidate == recipe_id:
+            continue
+        neighbours = lists.setdefault(candidate, {})
+        before = dict(neighbours)
+        if score > 0:
+            neighbours[recipe_id] = score
+        else:
+            neighbours.pop(recipe_id, None)
+        if len(neighbours) > k:
+            del neighbours[min(neighbours, key=neighbours.get)]
+        if neighbours != before:
+            changed.append(candidate)
+    SimilarRecipe.objects.filter(recipe__in=changed).delete()
+    SimilarRecipe.objects.bulk_create(
+        SimilarRecipe(recipe_id=recipe, similar_id=similar, score=score)
+        for recipe in changed
+        for similar, score in lists[recipe].items()
+    )
+
+
+def _run_in_worker(recipe_id):
+    with _lock:
+        _pending.discard(recipe_id)
+    try:
+        refresh(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось обновить похожие рецепты для %s', recipe_id
+        )
+    finally:
+        connection.close()
+
+
+def schedule_refresh(recipe):
+    """
+    Ставит обновление похожих рецептов в фоновую очередь после коммита.
+
+    Запрос на запись не ждет пересчета. Повторные изменения рецепта,
+    пока он ждет в очереди, пересчитываются один раз. При
+    SIMILAR_RECIPES_WORKERS = 0 списки обновляются только командой
+    build_similar_recipes.
+    """
+
+    def submit():
+        if not settings.SIMILAR_RECIPES_WORKERS:
+            return
+        global _executor
+        with _lock:
+            if recipe.pk in _pending:
+                return
+            _pending.add(recipe.pk)
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.SIMILAR_RECIPES_WORKERS,
+                    thread_name_prefix='similar-recipes',
+                )
+        _executor.submit(_run_in_worker, recipe.pk)
+
+    transaction.on_commit(submit)
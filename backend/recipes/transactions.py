@@ -0,0 +1,74 @@
+"""
+Данные, собранные обработчиками сигналов за одну транзакцию.
+
+Сигналы приходят для каждой строки, в том числе при каскадном
+удалении. on_commit_once() копит id по всей транзакции и вызывает
+обработчик один раз после коммита, pending() показывает уже собранные
+id, а mark_deleted() и is_deleted() - удаляемые объекты, чьи строки
+удаляются каскадом. Множество хранится в самом обработчике
+transaction.on_commit, поэтому при откате транзакции или точки
+сохранения оно отбрасывается вместе с ним.
+"""
+from django.db import transaction
+
+
+class _Pending(set):
+    """Обработчик on_commit с id, собранными за транзакцию."""
+
+    def __init__(self, key, callback):
+        super().__init__()
+        self.key = key
+        self.callback = callback
+
+    def __call__(self):
+        if self.callback is not None and self:
+            self.callback(*self)
+
+
+def _find(connection, key):
+    for entry in connection.run_on_commit:
+        callback = entry[1]
+        if isinstance(callback, _Pending) and callback.key == key:
+            return callback
+    return None
+
+
+def pending(key, using=None):
+    """id, собранные под ключом key в текущей транзакции."""
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return frozenset()
+    return _find(connection, key) or frozenset()
+
+
+def on_commit_once(key, callback, *ids, using=None):
+    """
+    Добавляет ids под ключом key; callback(*ids) вызывается после коммита.
+
+    Без callback id только запоминаются до конца транзакции. Вне
+    транзакции callback вызывается сразу, как в transaction.on_commit().
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        if callback is not None:
+            callback(*ids)
+        return
+    batch = _find(connection, key)
+    if batch is None:
+        batch = _Pending(key, callback)
+        transaction.on_commit(batch, using)
+    batch.update(ids)
+
+
+def _deleted_key(model):
+    return f'deleted:{model._meta.label}'
+
+
+def mark_deleted(instance):
+    """Запоминает удаляемый объект до конца транзакции (для pre_delete)."""
+    on_commit_once(_deleted_key(type(instance)), None, instance.pk)
+
+
+def is_deleted(model, pk):
+    """Удаляется ли объект model с pk в текущей транзакции."""
+    return pk in pending(_deleted_key(model))
@@ -0,0 +1,95 @@
+"""
+Популярность рецептов с экспоненциальным затуханием.
+
+Каждое добавление в избранное или список покупок дает рецепту вес
+TRENDING_WEIGHTS, который убывает вдвое за TRENDING_HALF_LIFE_HOURS.
+Пересчет инкрементальный: сохраненные очки умножаются на коэффициент
+затухания с прошлого пересчета, и к ним прибавляются только новые
+события: с created после границы TrendingRun.events_until.
+
+Граница отстает от момента пересчета на TRENDING_SETTLE_SECONDS.
+Курсор по id пропускал бы события, закоммиченные не в порядке id,
+а событие с created раньше границы видно всем транзакциям, если его
+транзакция длилась меньше этого срока.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from recipes.models import Favorite, RecipeTrend, ShoppingList, TrendingRun
+
+# Модель событий и ключ в TRENDING_WEIGHTS.
+EVENTS = (
+    (Favorite, 'favorite'),
+    (ShoppingList, 'shopping_list'),
+)
+
+
+def decay(seconds):
+    """Во сколько раз уменьшается вес события за seconds секунд."""
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 60 * 60
+    return 0.5 ** (max(seconds, 0) / half_life)
+
+
+@transaction.atomic
+def update_trending(full=False, now=None, batch_size=1000):
+    """
+    Пересчитывает популярность рецептов на момент now.
+
+    При full=True или первом запуске очки считаются заново по всем
+    событиям старше TRENDING_SETTLE_SECONDS. Возвращает число рецептов,
+    получивших новые события.
+    """
+    now = now or timezone.now()
+    until = now - timedelta(seconds=settings.TRENDING_SETTLE_SECONDS)
+    last_run = (
+        TrendingRun.objects.select_for_update()
+        .order_by('-computed_at').first()
+    )
+    if full or last_run is None or last_run.events_until is None:
+        RecipeTrend.objects.all().delete()
+        since = None
+    else:
+        factor = decay((now - last_run.computed_at).total_seconds())
+        RecipeTrend.objects.update(score=F('score') * factor)
+        RecipeTrend.objects.filter(
+            score__lt=settings.TRENDING_MIN_SCORE
+        ).delete()
+        since = last_run.events_until
+        until = max(until, since)
+
+    scores = {}
+    for model, weight_key in EVENTS:
+        weight = settings.TRENDING_WEIGHTS[weight_key]
+        events = model.objects.filter(created__lte=until).order_by()
+        if since is not None:
+            events = events.filter(created__gt=since)
+        for recipe, created in events.values_list(
+            'recipe', 'created'
+        ).iterator():
+            scores[recipe] = scores.get(recipe, 0) + weight * decay(
+                (now - created).total_seconds()
+            )
+
+    recipes = list(scores)
+    for start in range(0, len(recipes), batch_size):
+        batch = recipes[start:start + batch_size]
+        trends = RecipeTrend.objects.in_bulk(batch)
+        for trend in trends.values():
+            trend.score += scores[trend.pk]
+        RecipeTrend.objects.bulk_update(trends.values(), ('score',))
+        # Давние события, например добавления до появления created,
+        # не создают строк с почти нулевыми очками.
+        RecipeTrend.objects.bulk_create(
+            RecipeTrend(recipe_id=recipe, score=scores[recipe])
+            for recipe in batch
+            if recipe not in trends
+            and scores[recipe] >= settings.TRENDING_MIN_SCORE
+        )
+
+    run = TrendingRun.objects.create(computed_at=now, events_until=until)
+    TrendingRun.objects.exclude(pk=run.pk).delete()
+    return len(scores)
@@ -0,0 +1,102 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, IngredientsAmount, Recipe,
+                            ShoppingList, ShoppingListIngredient, Tag)
+from users.models import CustomUser, Follow
+
+
+@pytest.fixture(autouse=True)
+def nplusone_strict(settings):
+    """N+1 запросы в любом запросе к API роняют тест."""
+    settings.NPLUSONE_DETECTION = 'strict'
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def create_user(username):
+    return CustomUser.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='password',
+        first_name='Имя',
+        last_name='Фамилия',
+    )
+
+
+def create_recipes(author, count, tags, ingredients):
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=f'Рецепт {author.username} {number}',
+            image='recipes/images/test.jpg',
+            text='Описание',
+            cooking_time=number + 1,
+        )
+        recipe.tags.set(tags)
+        IngredientsAmount.objects.bulk_create(
+            IngredientsAmount(
+                recipe=recipe, ingredient_name=ingredient, amount=number + 1
+            )
+            for ingredient in ingredients
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+@pytest.fixture
+def user(db):
+    return create_user('user')
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                           slug=f'tag-{number}')
+        for number in range(2)
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(name=f'Ингредиент {number}',
+                                  measurement_unit='г')
+        for number in range(3)
+    ]
+
+
+@pytest.fixture
+def authors(db, user, tags, ingredients):
+    """Три автора по два рецепта, пользователь подписан на всех."""
+    authors = [create_user(f'author{number}') for number in range(3)]
+    for author in authors:
+        create_recipes(author, 2, tags, ingredients)
+        Follow.objects.create(user=user, author=author)
+    return authors
+
+
+@pytest.fixture
+def cart(user, authors):
+    """Все рецепты в избранном и в корзине пользователя."""
+    recipes = list(Recipe.objects.all())
+    for recipe in recipes:
+        Favorite.objects.create(user=user, recipe=recipe)
+        ShoppingList.objects.create(user=user, recipe=recipe)
+    ShoppingListIngredient.objects.add_recipes(user, *recipes)
+    return recipes
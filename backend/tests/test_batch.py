@@ -0,0 +1,56 @@
+from recipes.models import Favorite, Recipe
+
+URL_FAVORITE = '/api/recipes/favorite/'
+
+
+def test_batch_favorite(user_client, user, authors,
+                        django_assert_max_num_queries):
+    recipes = list(Recipe.objects.values_list('pk', flat=True))
+    Favorite.objects.create(user=user, recipe_id=recipes[0])
+    # Вставка, проверка оставшихся id и счетчики - независимо от размера.
+    with django_assert_max_num_queries(6):
+        response = user_client.post(
+            URL_FAVORITE, {'recipes': [*recipes, 10 ** 6]}, format='json'
+        )
+    assert response.status_code == 200
+    assert [item['status'] for item in response.json()] == (
+        ['exists'] + ['added'] * (len(recipes) - 1) + ['not_found']
+    )
+    assert set(
+        Recipe.objects.values_list('favorites_count', flat=True)
+    ) == {1}
+
+
+def test_batch_unfavorite(user_client, user, authors,
+                          django_assert_max_num_queries):
+    recipes = list(Recipe.objects.values_list('pk', flat=True))
+    for recipe in recipes[1:]:
+        Favorite.objects.create(user=user, recipe_id=recipe)
+    with django_assert_max_num_queries(4):
+        response = user_client.delete(
+            URL_FAVORITE, {'recipes': recipes}, format='json'
+        )
+    assert response.status_code == 200
+    assert [item['status'] for item in response.json()] == (
+        ['not_found'] + ['removed'] * (len(recipes) - 1)
+    )
+    assert not Favorite.objects.exists()
+    assert set(
+        Recipe.objects.values_list('favorites_count', flat=True)
+    ) == {0}
+
+
+def test_batch_unfavorite_without_returning(user_client, user, authors,
+                                            monkeypatch):
+    monkeypatch.setattr('api.mixins._supports_returning', lambda: False)
+    recipes = list(Recipe.objects.values_list('pk', flat=True))
+    for recipe in recipes:
+        Favorite.objects.create(user=user, recipe_id=recipe)
+    response = user_client.delete(
+        URL_FAVORITE, {'recipes': recipes}, format='json'
+    )
+    assert response.status_code == 200
+    assert not Favorite.objects.exists()
+    assert set(
+        Recipe.objects.values_list('favorites_count', flat=True)
+    ) == {0}
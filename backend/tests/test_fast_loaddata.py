@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.cache import RECIPE_FRAGMENTS_VERSION, get_version
+from api.snapshots import TAGS_VERSION
+from recipes.models import IngredientsAmount, Recipe
+
+FIXTURE = [
+    {'model': 'users.customuser', 'pk': 1, 'fields': {
+        'username': 'author', 'email': 'author@example.com',
+        'first_name': 'Имя', 'last_name': 'Фамилия', 'password': '!',
+    }},
+    {'model': 'recipes.tag', 'pk': 1, 'fields': {
+        'name': 'Завтрак', 'color': '#000001', 'slug': 'breakfast',
+    }},
+    {'model': 'recipes.tag', 'pk': 2, 'fields': {
+        'name': 'Обед', 'color': '#000002', 'slug': 'lunch',
+    }},
+    {'model': 'recipes.ingredient', 'pk': 1, 'fields': {
+        'name': 'соль', 'measurement_unit': 'г',
+    }},
+    {'model': 'recipes.recipe', 'pk': 1, 'fields': {
+        'author': 1, 'name': 'Рецепт', 'image': 'recipes/images/test.jpg',
+        'text': 'Описание', 'cooking_time': 5, 'tags': [1, 2],
+    }},
+    {'model': 'recipes.ingredientsamount', 'pk': 1, 'fields': {
+        'recipe': 1, 'ingredient_name': 1, 'amount': 10,
+    }},
+]
+
+
+@pytest.fixture
+def fixture_path(tmp_path):
+    path = tmp_path / 'fixture.json'
+    path.write_text(json.dumps(FIXTURE, ensure_ascii=False), 'utf-8')
+    return str(path)
+
+
+@pytest.mark.django_db
+def test_recipe_with_tags(fixture_path):
+    tags_version = get_version(TAGS_VERSION)
+    fragments_version = get_version(RECIPE_FRAGMENTS_VERSION)
+    with CaptureQueriesContext(connection) as queries:
+        call_command('fast_loaddata', fixture_path, stdout=None)
+
+    # Строки связи тегов без pk: id назначает база, а не явный NULL,
+    # который PostgreSQL отвергает.
+    tag_inserts = [
+        query['sql'] for query in queries.captured_queries
+        if query['sql'].startswith('INSERT INTO "recipes_recipe_tags"')
+    ]
+    assert tag_inserts
+    assert all('"id"' not in sql for sql in tag_inserts)
+    recipe = Recipe.objects.get()
+    assert set(recipe.tags.values_list('slug', flat=True)) == {
+        'breakfast', 'lunch'
+    }
+    assert IngredientsAmount.objects.filter(recipe=recipe).count() == 1
+    assert get_version(TAGS_VERSION) > tags_version
+    assert get_version(RECIPE_FRAGMENTS_VERSION) > fragments_version
+
+
+@pytest.mark.django_db
+def test_existing_objects(fixture_path):
+    call_command('fast_loaddata', fixture_path, stdout=None)
+    with pytest.raises(CommandError, match='пустую базу'):
+        call_command('fast_loaddata', fixture_path, stdout=None)
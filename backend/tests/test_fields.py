@@ -0,0 +1,38 @@
+import base64
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api.fields import Base64ImageField
+
+
+def png_bytes(size=(64, 48)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 100, 50)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('encode', (base64.b64encode, base64.encodebytes))
+def test_decodes_base64_with_and_without_line_breaks(encode):
+    content = png_bytes()
+    data = 'data:image/png;base64,' + encode(content).decode()
+    image = Base64ImageField().to_internal_value(data)
+    # Файл на диске: Django проверяет изображение по пути.
+    assert image.temporary_file_path()
+    image.seek(0)
+    assert image.read() == content
+    assert image.size == len(content)
+
+
+def test_rejects_wrong_signature():
+    data = 'data:image/jpeg;base64,' + base64.b64encode(png_bytes()).decode()
+    with pytest.raises(ValidationError):
+        Base64ImageField().to_internal_value(data)
+
+
+def test_rejects_truncated_base64():
+    data = 'data:image/png;base64,' + base64.b64encode(png_bytes()).decode()
+    with pytest.raises(ValidationError):
+        Base64ImageField().to_internal_value(data[:-1])
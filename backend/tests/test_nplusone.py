@@ -0,0 +1,35 @@
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from api.nplusone import (NPlusOneError, NPlusOneMiddleware,
+                          detect_n_plus_one)
+from recipes.models import Recipe
+
+
+def authors_one_by_one(request=None):
+    for recipe in Recipe.objects.all():
+        recipe.author.username
+    return HttpResponse()
+
+
+@pytest.mark.django_db
+def test_n_plus_one_raises(authors):
+    with pytest.raises(NPlusOneError, match='test_nplusone.py'):
+        with detect_n_plus_one(threshold=3):
+            authors_one_by_one()
+
+
+@pytest.mark.django_db
+def test_select_related_passes(authors):
+    with detect_n_plus_one(threshold=3):
+        for recipe in Recipe.objects.select_related('author'):
+            recipe.author.username
+
+
+@pytest.mark.django_db
+def test_strict_middleware_raises(authors):
+    middleware = NPlusOneMiddleware(authors_one_by_one)
+    request = RequestFactory().get('/api/recipes/')
+    with pytest.raises(NPlusOneError, match='GET /api/recipes/'):
+        middleware(request)
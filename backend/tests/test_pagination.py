@@ -0,0 +1,24 @@
+import pytest
+
+URL_RECIPES = '/api/recipes/'
+
+
+def test_cursor_pages(client, authors):
+    response = client.get(URL_RECIPES, {'cursor': '', 'limit': 4})
+    assert response.status_code == 200
+    assert 'count' not in response.json()
+
+
+@pytest.mark.parametrize('params', (
+    {'ordering': 'trending'},
+    {'search': 'Рецепт'},
+))
+def test_cursor_with_custom_order(client, authors, params):
+    response = client.get(URL_RECIPES, {'cursor': '', **params})
+    assert response.status_code == 400
+    assert 'cursor' in response.json()
+
+
+def test_custom_order_without_cursor(client, authors):
+    response = client.get(URL_RECIPES, {'ordering': 'trending'})
+    assert response.status_code == 200
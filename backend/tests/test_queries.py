@@ -0,0 +1,64 @@
+import pytest
+
+from recipes.models import Recipe
+
+URL_RECIPES = '/api/recipes/'
+URL_SUBSCRIPTIONS = '/api/users/subscriptions/'
+URL_DOWNLOAD = '/api/recipes/download_shopping_cart/'
+
+
+@pytest.mark.parametrize('authenticated', (False, True))
+def test_recipe_list(client, user_client, cart, authenticated,
+                     django_assert_num_queries):
+    client = user_client if authenticated else client
+    with django_assert_num_queries(6):
+        response = client.get(URL_RECIPES)
+    assert response.status_code == 200
+    assert len(response.json()['results']) == len(cart)
+
+
+def test_recipe_list_cached(user_client, cart, django_assert_num_queries):
+    # Представления рецептов уже в кэше: читаются только рецепты
+    # и версия кэша.
+    user_client.get(URL_RECIPES)
+    with django_assert_num_queries(3):
+        response = user_client.get(URL_RECIPES)
+    assert response.status_code == 200
+    assert len(response.json()['results']) == len(cart)
+
+
+def test_recipe_retrieve(user_client, cart, django_assert_num_queries):
+    with django_assert_num_queries(5):
+        response = user_client.get(f'{URL_RECIPES}{cart[0].pk}/')
+    assert response.status_code == 200
+    assert response.json()['is_favorited'] is True
+
+
+def test_subscriptions(user_client, authors, django_assert_num_queries):
+    with django_assert_num_queries(3):
+        response = user_client.get(
+            URL_SUBSCRIPTIONS, {'recipes_limit': 1}
+        )
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert len(results) == len(authors)
+    assert all(len(author['recipes']) == 1 for author in results)
+
+
+def test_subscriptions_latest_recipes(user_client, authors):
+    response = user_client.get(URL_SUBSCRIPTIONS, {'recipes_limit': 1})
+    for author in response.json()['results']:
+        latest = Recipe.objects.filter(author=author['id']).order_by(
+            '-pub_date', '-pk'
+        ).first()
+        assert [recipe['id'] for recipe in author['recipes']] == [latest.pk]
+
+
+def test_download_shopping_cart(user_client, cart, ingredients,
+                                django_assert_num_queries):
+    with django_assert_num_queries(2):
+        response = user_client.get(URL_DOWNLOAD)
+        content = b''.join(response.streaming_content).decode()
+    assert response.status_code == 200
+    for ingredient in ingredients:
+        assert ingredient.name in content
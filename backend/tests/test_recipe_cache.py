@@ -0,0 +1,54 @@
+from recipes.models import IngredientsAmount, Recipe
+
+URL_RECIPES = '/api/recipes/'
+
+
+def get_recipe(client, recipe):
+    return client.get(f'{URL_RECIPES}{recipe.pk}/').json()
+
+
+def test_ingredient_change_refreshes_cached_recipe(user_client, cart):
+    recipe = cart[0]
+    get_recipe(user_client, recipe)
+    amount = IngredientsAmount.objects.filter(recipe=recipe).first()
+    amount.amount = 999
+    amount.save()
+    amounts = [
+        ingredient['amount']
+        for ingredient in get_recipe(user_client, recipe)['ingredients']
+    ]
+    assert 999 in amounts
+
+
+def test_partial_save_refreshes_cached_recipe(user_client, cart):
+    recipe = Recipe.objects.get(pk=cart[0].pk)
+    get_recipe(user_client, recipe)
+    recipe.name = 'Новое название'
+    recipe.save(update_fields=('name',))
+    assert get_recipe(user_client, recipe)['name'] == 'Новое название'
+
+
+def test_author_change_refreshes_cached_recipe(user_client, cart):
+    recipe = cart[0]
+    get_recipe(user_client, recipe)
+    author = recipe.author
+    author.first_name = 'Новое имя'
+    author.save()
+    assert get_recipe(user_client, recipe)['author']['first_name'] == (
+        'Новое имя'
+    )
+
+
+def test_password_change_keeps_recipe_keys(cart):
+    recipe = Recipe.objects.get(pk=cart[0].pk)
+    author = recipe.author
+    author.set_password('new-password')
+    author.save()
+    assert Recipe.objects.get(pk=recipe.pk).updated_at == recipe.updated_at
+    # Рецепты других авторов не затрагиваются.
+    author.last_name = 'Новая фамилия'
+    author.save(update_fields=('last_name',))
+    assert Recipe.objects.exclude(author=author).filter(
+        updated_at__gt=recipe.updated_at
+    ).count() == 0
+    assert Recipe.objects.get(pk=recipe.pk).updated_at > recipe.updated_at
@@ -0,0 +1,38 @@
+import pytest
+from rest_framework.test import APIClient
+
+URL_DOWNLOAD = '/api/recipes/download_shopping_cart/'
+FORMATS = {
+    'txt': 'text/plain',
+    'csv': 'text/csv',
+    'pdf': 'application/pdf',
+}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('format', FORMATS)
+def test_unauthorized(format):
+    response = APIClient().get(URL_DOWNLOAD, {'format': format})
+    assert response.status_code == 401
+    assert response['Content-Type'] == 'application/json'
+    assert 'detail' in response.json()
+
+
+@pytest.mark.parametrize('media_type', FORMATS.values())
+def test_unknown_format(user_client, cart, media_type):
+    response = user_client.get(
+        URL_DOWNLOAD, {'format': 'xml'}, HTTP_ACCEPT=media_type
+    )
+    assert response.status_code == 406
+    assert response['Content-Type'] == 'application/json'
+    assert 'xml' in response.json()['detail']
+
+
+@pytest.mark.parametrize('format', FORMATS)
+def test_format_param_wins_over_accept(user_client, cart, format):
+    response = user_client.get(
+        URL_DOWNLOAD, {'format': format}, HTTP_ACCEPT='application/json'
+    )
+    b''.join(response.streaming_content)
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith(FORMATS[format])
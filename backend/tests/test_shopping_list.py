@@ -0,0 +1,29 @@
+from recipes.models import ShoppingListIngredient
+
+
+def test_apply_delta_adds_to_existing_rows(user, ingredients):
+    first, second, _ = ingredients
+    ShoppingListIngredient.objects.create(
+        user=user, ingredient=first, amount=5
+    )
+    ShoppingListIngredient.objects.apply_delta(
+        (user.pk,), {first.pk: 3, second.pk: 2}
+    )
+    assert dict(
+        ShoppingListIngredient.objects.filter(user=user)
+        .values_list('ingredient', 'amount')
+    ) == {first.pk: 8, second.pk: 2}
+
+
+def test_apply_delta_removes_exhausted_rows(user, ingredients):
+    first, second, _ = ingredients
+    ShoppingListIngredient.objects.apply_delta(
+        (user.pk,), {first.pk: 3, second.pk: 2}
+    )
+    ShoppingListIngredient.objects.apply_delta(
+        (user.pk,), {first.pk: -3, second.pk: -1}
+    )
+    assert dict(
+        ShoppingListIngredient.objects.filter(user=user)
+        .values_list('ingredient', 'amount')
+    ) == {second.pk: 1}
@@ -0,0 +1,71 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.cache import get_version
+from api.pantry import PANTRY_VERSION
+from recipes.models import (Favorite, Ingredient, IngredientsAmount, Recipe,
+                            ShoppingList)
+from tests.conftest import create_recipes, create_user
+
+
+def updates_of(queries, table):
+    return [
+        query['sql'] for query in queries.captured_queries
+        if query['sql'].startswith(f'UPDATE "{table}"')
+    ]
+
+
+# Транзакционные тесты: обработчики on_commit выполняются при коммите.
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def test_recipe_delete_records_changes_once(user, tags):
+    ingredients = [
+        Ingredient.objects.create(name=f'Ингредиент {number}',
+                                  measurement_unit='г')
+        for number in range(10)
+    ]
+    recipe, = create_recipes(user, 1, tags, ingredients)
+    version = get_version(PANTRY_VERSION)
+    with CaptureQueriesContext(connection) as queries:
+        recipe.delete()
+    assert not updates_of(queries, 'recipes_recipe')
+    assert get_version(PANTRY_VERSION) == version + 1
+
+
+def test_ingredient_rows_touch_recipe_once(user, tags, ingredients):
+    recipe, = create_recipes(user, 1, tags, ingredients)
+    version = get_version(PANTRY_VERSION)
+    with CaptureQueriesContext(connection) as queries:
+        IngredientsAmount.objects.filter(recipe=recipe).delete()
+    assert len(updates_of(queries, 'recipes_recipe')) == 1
+    assert get_version(PANTRY_VERSION) == version + 1
+
+
+def test_recipe_delete_skips_its_counters(user, tags, ingredients):
+    recipe, = create_recipes(user, 1, tags, ingredients)
+    for number in range(20):
+        Favorite.objects.create(
+            user=create_user(f'fan{number}'), recipe=recipe
+        )
+    with CaptureQueriesContext(connection) as queries:
+        recipe.delete()
+    assert not updates_of(queries, 'recipes_recipe')
+
+
+def test_user_delete_updates_counters_in_batch(user, authors):
+    recipes = list(Recipe.objects.all())
+    for recipe in recipes:
+        Favorite.objects.create(user=user, recipe=recipe)
+        ShoppingList.objects.create(user=user, recipe=recipe)
+    with CaptureQueriesContext(connection) as queries:
+        user.delete()
+    counter_updates = [
+        sql for sql in updates_of(queries, 'recipes_recipe')
+        if '_count' in sql
+    ]
+    assert len(counter_updates) == 2
+    assert set(
+        Recipe.objects.values_list('favorites_count', 'in_carts_count')
+    ) == {(0, 0)}
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import pytest
+from django.utils import timezone
+
+from recipes.models import Favorite, RecipeTrend, ShoppingList
+from recipes.trending import update_trending
+
+
+def add_event(model, user, recipe, created):
+    event = model.objects.create(user=user, recipe=recipe)
+    model.objects.filter(pk=event.pk).update(created=created)
+
+
+@pytest.mark.django_db
+def test_late_commit_is_counted(user, authors, settings):
+    """Событие с меньшим created, записанное позже, не теряется."""
+    settings.TRENDING_SETTLE_SECONDS = 300
+    first, second = authors[0].recipes.all()[:2]
+    now = timezone.now()
+    add_event(Favorite, user, first, now - timedelta(minutes=10))
+    update_trending(now=now)
+    assert set(RecipeTrend.objects.values_list('pk', flat=True)) == {
+        first.pk
+    }
+
+    # Транзакция началась до пересчета, а закоммитилась после него.
+    add_event(ShoppingList, user, second, now - timedelta(minutes=2))
+    update_trending(now=now + timedelta(minutes=1))
+    assert not RecipeTrend.objects.filter(pk=second.pk).exists()
+    update_trending(now=now + timedelta(minutes=10))
+    assert RecipeTrend.objects.filter(pk=second.pk).exists()
+
+
+@pytest.mark.django_db
+def test_events_are_counted_once(user, authors, settings):
+    settings.TRENDING_SETTLE_SECONDS = 0
+    recipe = authors[0].recipes.first()
+    now = timezone.now()
+    add_event(Favorite, user, recipe, now - timedelta(minutes=1))
+    update_trending(now=now)
+    update_trending(now=now)
+    incremental = RecipeTrend.objects.get(pk=recipe.pk).score
+    update_trending(full=True, now=now)
+    assert incremental == pytest.approx(
+        RecipeTrend.objects.get(pk=recipe.pk).score
+    )
+
+
+@pytest.mark.django_db
+def test_events_before_created_field_are_not_trending(user, authors):
+    recipe = authors[0].recipes.first()
+    # Так миграция заполняет created у добавлений, сделанных до нее.
+    created = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    add_event(Favorite, user, recipe, created)
+    update_trending()
+    assert not RecipeTrend.objects.exists()
@@ -0,0 +1,23 @@
+from api.cache import bump_version, get_version
+from api.models import DataVersion
+from api.search import INGREDIENTS_VERSION, IngredientIndex
+from recipes.models import Ingredient
+
+
+def test_bump_version(db):
+    assert get_version('test') == 1
+    assert bump_version('test') == 2
+    assert bump_version('test') == 3
+    assert get_version('test') == 3
+
+
+def test_index_sees_version_bumped_elsewhere(ingredients):
+    ingredient_index = IngredientIndex()
+    assert len(ingredient_index.all()) == len(ingredients)
+    Ingredient.objects.create(name='Новый', measurement_unit='г')
+    # Другой процесс или команда меняет версию в базе.
+    DataVersion.objects.update_or_create(
+        name=INGREDIENTS_VERSION,
+        defaults={'version': get_version(INGREDIENTS_VERSION) + 1},
+    )
+    assert len(ingredient_index.all()) == len(ingredients) + 1
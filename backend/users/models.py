@@ -27,6 +27,11 @@ class CustomUser(AbstractUser):
         verbose_name='Пароль',
         max_length=150,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('username',)